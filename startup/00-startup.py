@@ -3,18 +3,311 @@
 print("Loading NSLS-II HEX profile collection...")
 
 import asyncio
+import atexit
+import builtins
+import collections
 import datetime
+import importlib
+import json
 import logging
 import os
 import subprocess
+import tempfile
+import threading
 import time as ttime
 import warnings
+from contextlib import contextmanager
 from pathlib import Path
 
+
+class FileLoadingTimer:
+    """
+    Hierarchical profiler for the startup files.
+
+    Each ``start_timer``/``stop_timer`` pair (one per startup file) and each
+    ``section`` opens a node in a tree of timings. The time spent in ``import``
+    statements is recorded automatically for the open node, the other categories
+    ("device construction", "pv connection", "redis", "tiled", "configure_base")
+    are recorded with ``section(name, category=...)`` around the relevant code.
+
+    Set ``HEX_STARTUP_PROFILE_REPORT`` to write a JSON report at the end of the
+    startup, and ``HEX_STARTUP_PROFILE_BASELINE`` to a previous report to flag
+    the files which got slower.
+
+    The import hook is removed by finish(), at the end of the last startup file.
+    If a startup file fails, finish() is never called, so the hook is also
+    removed before the first IPython command runs, or at exit.
+    """
+
+    def __init__(self):
+        from IPython import get_ipython
+
+        self.root = self._new_node("profile", "total")
+        self._stack = []
+        self._thread_id = threading.get_ident()
+        self._importing = False
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        atexit.register(self._restore)
+        self._ipython = get_ipython()
+        if self._ipython is not None:
+            self._ipython.events.register("pre_run_cell", self._restore)
+
+    @property
+    def loading(self):
+        return bool(self._stack)
+
+    @staticmethod
+    def _new_node(name, category):
+        return {
+            "name": name,
+            "category": category,
+            "start": ttime.monotonic(),
+            "elapsed": 0.0,
+            "import_time": 0.0,
+            "children": [],
+        }
+
+    def _timed_import(self, *args, **kwargs):
+        # Only the outermost import statement of the startup thread is timed.
+        if (
+            self._importing
+            or not self._stack
+            or threading.get_ident() != self._thread_id
+        ):
+            return self._original_import(*args, **kwargs)
+        self._importing = True
+        start_time = ttime.monotonic()
+        try:
+            return self._original_import(*args, **kwargs)
+        finally:
+            self._stack[-1]["import_time"] += ttime.monotonic() - start_time
+            self._importing = False
+
+    def _push(self, name, category):
+        node = self._new_node(name, category)
+        (self._stack[-1] if self._stack else self.root)["children"].append(node)
+        self._stack.append(node)
+        return node
+
+    def _pop(self, name):
+        if not self._stack or self._stack[-1]["name"] != name:
+            raise Exception(f"Timer for {name} is not the innermost running timer!")
+        node = self._stack.pop()
+        node["elapsed"] = ttime.monotonic() - node["start"]
+        return node
+
+    def start_timer(self, filename):
+        print(f"{'  ' * len(self._stack)}Loading {filename}...")
+        self._push(filename, "file")
+
+    def stop_timer(self, filename):
+        node = self._pop(filename)
+        print(
+            f"{'  ' * len(self._stack)}Done loading {filename} in {node['elapsed']:.6f} seconds."
+        )
+
+    @contextmanager
+    def section(self, name, category=None):
+        """Time a nested section of a startup file, a no-op once the startup is done."""
+        if not self._stack:
+            yield
+            return
+        self._push(name, category or name)
+        try:
+            yield
+        finally:
+            self._pop(name)
+
+    @classmethod
+    def _breakdown(cls, node, categories):
+        exclusive = node["elapsed"] - node["import_time"]
+        for child in node["children"]:
+            exclusive -= child["elapsed"]
+            cls._breakdown(child, categories)
+        category = "other" if node["category"] == "file" else node["category"]
+        categories[category] = categories.get(category, 0.0) + exclusive
+        categories["import"] = categories.get("import", 0.0) + node["import_time"]
+        return categories
+
+    def report(self):
+        """Return the timings of all loaded files as a JSON-serializable dict."""
+
+        def strip(node):
+            return {
+                "name": node["name"],
+                "category": node["category"],
+                "elapsed": node["elapsed"],
+                "import_time": node["import_time"],
+                "children": [strip(child) for child in node["children"]],
+            }
+
+        files = {}
+        for node in self.root["children"]:
+            entry = files.setdefault(
+                node["name"], {"elapsed": 0.0, "categories": {}, "sections": []}
+            )
+            entry["elapsed"] += node["elapsed"]
+            self._breakdown(node, entry["categories"])
+            entry["sections"].append(strip(node))
+
+        return {
+            "created": datetime.datetime.now().isoformat(),
+            "total": sum(entry["elapsed"] for entry in files.values()),
+            "files": files,
+        }
+
+    def write_report(self, path):
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Startup profile written to {path}")
+        return report
+
+    def compare_to_baseline(self, baseline_path, threshold=0.2, min_delta=0.05):
+        """
+        Compare the current timings with a stored report.
+
+        A file is flagged as regressed if it got slower by more than ``threshold``
+        (relative) and ``min_delta`` seconds (absolute).
+        """
+        with open(baseline_path) as f:
+            baseline = json.load(f)["files"]
+
+        regressions = {}
+        for filename, entry in self.report()["files"].items():
+            if filename not in baseline:
+                continue
+            before, after = baseline[filename]["elapsed"], entry["elapsed"]
+            if after - before > min_delta and after > before * (1 + threshold):
+                regressions[filename] = {"baseline": before, "current": after}
+
+        for filename, times in regressions.items():
+            print(
+                f"REGRESSION: {filename} took {times['current']:.3f} s "
+                f"(baseline {times['baseline']:.3f} s)"
+            )
+        return regressions
+
+    def _restore(self, *args):
+        """Remove the import hook and close the timers a failed startup file left open."""
+        if builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._original_import
+        if self._ipython is not None:
+            try:
+                self._ipython.events.unregister("pre_run_cell", self._restore)
+            except ValueError:
+                pass  # already unregistered
+        while self._stack:
+            node = self._stack.pop()
+            node["elapsed"] = ttime.monotonic() - node["start"]
+            print(f"{node['name']} did not finish loading.")
+
+    def finish(self):
+        """Restore the import machinery and write/compare the report if requested."""
+        self._restore()
+        report_path = os.environ.get("HEX_STARTUP_PROFILE_REPORT")
+        baseline_path = os.environ.get("HEX_STARTUP_PROFILE_BASELINE")
+        if report_path:
+            self.write_report(report_path)
+        if baseline_path and os.path.exists(baseline_path):
+            self.compare_to_baseline(baseline_path)
+
+
+file_loading_timer = FileLoadingTimer()
+file_loading_timer.start_timer(__file__)
+
+
+class LazyImport:
+    """
+    Placeholder for a module, or an attribute of a module, imported on first use.
+
+    The import happens on the first attribute access or call, so helpers such as
+    ``save_image`` only pay for PIL when they are used. Placeholders can't be used
+    as base classes or in ``isinstance`` checks; import those names directly.
+    """
+
+    registry = {}
+
+    def __init__(self, module_name, attribute=None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+        self.load_time = None
+        LazyImport.registry[self.qualified_name] = self
+
+    @property
+    def qualified_name(self):
+        if self._attribute is None:
+            return self._module_name
+        return f"{self._module_name}.{self._attribute}"
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def _lazy_load(self):
+        if self._target is None:
+            start_time = ttime.monotonic()
+            target = importlib.import_module(self._module_name)
+            if self._attribute is not None:
+                target = getattr(target, self._attribute)
+            self.load_time = ttime.monotonic() - start_time
+            self._target = target
+        return self._target
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._lazy_load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_load()(*args, **kwargs)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def __repr__(self):
+        if self._target is None:
+            return f"<LazyImport {self.qualified_name!r} (not imported)>"
+        return repr(self._target)
+
+
+def lazy_import(module_name, attribute=None):
+    """Return a placeholder for ``module_name`` (or ``module_name.attribute``)."""
+    return LazyImport.registry.get(
+        module_name if attribute is None else f"{module_name}.{attribute}"
+    ) or LazyImport(module_name, attribute)
+
+
+# Simulation mode: the profile runs without IOCs, Redis or a Tiled server (see 02-simulation.py).
+HEX_SIMULATION = os.environ.get("HEX_PROFILE_SIMULATION", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+HEX_SIM_DATA_DIR = Path(
+    os.environ.get("HEX_SIM_DATA_DIR", Path(tempfile.gettempdir()) / "hex-sim")
+)
+
+
+def lazy_import_report():
+    """Print which of the deferred imports were actually needed in this session."""
+    print("Deferred imports:")
+    for name, placeholder in sorted(LazyImport.registry.items()):
+        if placeholder.loaded:
+            print(f"    {name:40}: imported in {placeholder.load_time:.3f} seconds")
+        else:
+            print(f"    {name:40}: not imported")
+    return {
+        name: placeholder.loaded for name, placeholder in LazyImport.registry.items()
+    }
+
+
 import epicscorelibs.path.pyepics
-import matplotlib.pyplot as plt
 import nslsii
 import ophyd.signal
+import orjson
 import redis
 from bluesky.callbacks.broker import post_run, verify_files_saved
 from bluesky.callbacks.tiled_writer import TiledWriter
@@ -24,51 +317,84 @@ from IPython import get_ipython
 from IPython.terminal.prompts import Prompts, Token
 from nslsii import configure_base, configure_kafka_publisher
 from ophyd.signal import EpicsSignalBase
-from redis_json_dict import RedisJSONDict
+from redis_json_dict import ObservableMapping, ObservableSequence, RedisJSONDict
 from tiled.client import from_uri
 
 # warnings.filterwarnings("ignore")
 
-plt.ion()
+# Note: 'plt' is imported and put into interactive mode by configure_base(mpl=True) below.
 
 
 class ProposalIDPrompt(Prompts):
+    """
+    Prompt showing the current data session.
+
+    The value is read when the prompt is installed. With keyspace notifications
+    (see CachedRedisJSONDict) ``data_session`` is cached and kept up to date by
+    the notifications, so drawing the prompt reads the local copy. Without them a
+    background thread refreshes the value instead, so drawing the prompt never
+    waits on Redis; if it could not be refreshed recently, the last known value
+    is shown with a '(stale)' marker.
+    """
+
+    refresh_period = 2.0
+    stale_after = 3 * refresh_period
+
+    def __init__(self, shell, md, **kwargs):
+        super().__init__(shell, **kwargs)
+        self.md = md
+        self.data_session = "N/A"
+        self.last_refresh = None
+        self._refresh_thread = None
+        self._refresh()
+        if not self.cached:
+            self._start_refresh_thread()
+
+    @property
+    def cached(self):
+        return getattr(self.md, "notifications", False)
+
+    def _start_refresh_thread(self):
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop, name="prompt-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def _refresh(self):
+        try:
+            self.data_session = self.md.get("data_session", "N/A")
+        except Exception:
+            pass  # Redis unreachable; keep the last value
+        else:
+            self.last_refresh = ttime.monotonic()
+
+    def _refresh_loop(self):
+        while True:
+            ttime.sleep(self.refresh_period)
+            self._refresh()
+
+    @property
+    def stale(self):
+        return (
+            self.last_refresh is None
+            or ttime.monotonic() - self.last_refresh > self.stale_after
+        )
+
     def in_prompt_tokens(self, cli=None):
+        if self.cached:
+            self._refresh()  # served from the cache
+        elif self._refresh_thread is None:
+            self._start_refresh_thread()  # the notifications were lost
         return [
             (
                 Token.Prompt,
-                f"{RE.md.get('data_session', 'N/A')} [",
+                f"{self.data_session}{' (stale)' if self.stale else ''} [",
             ),
             (Token.PromptNum, str(self.shell.execution_count)),
             (Token.Prompt, "]: "),
         ]
 
 
-ip = get_ipython()
-ip.prompts = ProposalIDPrompt(ip)
-
-
-class FileLoadingTimer:
-
-    def __init__(self):
-        self.start_time = 0
-        self.loading = False
-
-    def start_timer(self, filename):
-        if self.loading:
-            raise Exception("File already loading!")
-
-        print(f"Loading {filename}...")
-        self.start_time = ttime.time()
-        self.loading = True
-
-    def stop_timer(self, filename):
-
-        elapsed = ttime.time() - self.start_time
-        print(f"Done loading {filename} in {elapsed:.6f} seconds.")
-        self.loading = False
-
-
 EpicsSignalBase.set_defaults(timeout=10, connection_timeout=10)
 
 # The call below creates 'RE' and 'db' objects in the IPython user namespace.
@@ -77,29 +403,223 @@ EpicsSignalBase.set_defaults(timeout=10, connection_timeout=10)
 #                publish_documents_with_kafka=True,
 #                pbar=True)
 
-configure_base(
-    get_ipython().user_ns,
-    Broker.named("temp"),
-    pbar=True,
-    bec=True,
-    magics=True,
-    mpl=True,
-    epics_context=False,
-    publish_documents_with_kafka=False,
-)
+with file_loading_timer.section("configure_base"):
+    configure_base(
+        get_ipython().user_ns,
+        Broker.named("temp"),
+        pbar=True,
+        bec=True,
+        magics=True,
+        mpl=True,
+        epics_context=False,
+        publish_documents_with_kafka=False,
+    )
+
+
+class CallbackProfiler:
+    """
+    Latency of every RunEngine subscriber, per document type.
+
+    After ``install(RE)``, every callback passed to ``RE.subscribe`` is wrapped
+    to record call counts and durations. ``show()`` prints the table (calls,
+    p50, p99 and max per callback and document type), ``write_prometheus()``
+    writes it in the Prometheus text format (to the file named by
+    $HEX_CALLBACK_METRICS_FILE after every run, if set), and a summary of each
+    run is printed and kept in ``run_summaries`` at its stop document.
+
+    Callbacks wrapped with ``per_run=False`` (e.g. the spool uploaders, which
+    run in their own threads and deliver documents of earlier runs too) are only
+    included in the table. The statistics are guarded by a lock, since wrapped
+    callbacks may run in any thread.
+    """
+
+    def __init__(self, max_samples=10000, metrics_file=None):
+        self.max_samples = max_samples
+        self.metrics_file = metrics_file
+        self.samples = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.max_samples)
+        )
+        self.counts = collections.Counter()
+        self.run_summaries = {}
+        self._lock = threading.Lock()
+        self._run_stats = collections.defaultdict(
+            lambda: [0, 0.0, 0.0]
+        )  # count, total, max
+
+    @staticmethod
+    def label(func):
+        func = getattr(func, "__wrapped__", func)
+        return getattr(func, "__name__", type(func).__name__)
+
+    def wrap(self, func, label=None, per_run=True):
+        label = label or self.label(func)
+
+        def profiled(name, doc):
+            start = ttime.perf_counter()
+            try:
+                return func(name, doc)
+            finally:
+                self.record(label, name, ttime.perf_counter() - start, per_run)
+
+        profiled.__wrapped__ = func
+        profiled.__name__ = label
+        return profiled
+
+    def record(self, label, name, elapsed, per_run=True):
+        key = (label, name)
+        with self._lock:
+            self.counts[key] += 1
+            self.samples[key].append(elapsed)
+            if per_run:
+                stats = self._run_stats[key]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    def install(self, RE):
+        subscribe = RE.subscribe
+
+        def profiled_subscribe(func, name="all"):
+            return subscribe(self.wrap(func), name)
+
+        profiled_subscribe.__doc__ = subscribe.__doc__
+        RE.subscribe = profiled_subscribe
+        subscribe(self._on_document)
+
+    def _on_document(self, name, doc):
+        if name == "start":
+            with self._lock:
+                self._run_stats.clear()
+        elif name == "stop":
+            # Covers the documents of the run before the stop document.
+            with self._lock:
+                summary = {
+                    f"{label}/{doc_name}": {
+                        "calls": count,
+                        "total": total,
+                        "max": maximum,
+                    }
+                    for (label, doc_name), (
+                        count,
+                        total,
+                        maximum,
+                    ) in self._run_stats.items()
+                }
+            self.run_summaries[doc["run_start"]] = summary
+            slowest = sorted(summary.items(), key=lambda item: -item[1]["total"])[:3]
+            print(
+                "Callback time: "
+                + ", ".join(
+                    f"{key} {stats['total']:.3f} s ({stats['calls']} calls)"
+                    for key, stats in slowest
+                )
+            )
+            if self.metrics_file:
+                self.write_prometheus(self.metrics_file)
+
+    @staticmethod
+    def _quantile(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def table(self):
+        with self._lock:
+            snapshot = [
+                (key, self.counts[key], list(samples))
+                for key, samples in self.samples.items()
+            ]
+        rows = []
+        for (label, name), calls, samples in sorted(snapshot):
+            rows.append(
+                (
+                    label,
+                    name,
+                    calls,
+                    self._quantile(samples, 0.5),
+                    self._quantile(samples, 0.99),
+                    max(samples),
+                )
+            )
+        return rows
+
+    def show(self):
+        print(
+            f"{'callback':30} {'document':15} {'calls':>8} {'p50 [ms]':>10} {'p99 [ms]':>10} {'max [ms]':>10}"
+        )
+        for label, name, calls, p50, p99, maximum in self.table():
+            print(
+                f"{label:30} {name:15} {calls:8} {1e3 * p50:10.3f} {1e3 * p99:10.3f} {1e3 * maximum:10.3f}"
+            )
+
+    def write_prometheus(self, path):
+        lines = [
+            "# HELP bluesky_callback_calls_total Documents processed by a RunEngine subscriber.",
+            "# TYPE bluesky_callback_calls_total counter",
+        ]
+        rows = self.table()
+        for label, name, calls, *_ in rows:
+            lines.append(
+                f'bluesky_callback_calls_total{{callback="{label}",document="{name}"}} {calls}'
+            )
+        lines += [
+            "# HELP bluesky_callback_latency_seconds Time spent by a RunEngine subscriber on one document.",
+            "# TYPE bluesky_callback_latency_seconds summary",
+        ]
+        for label, name, calls, p50, p99, maximum in rows:
+            labels = f'callback="{label}",document="{name}"'
+            lines.append(
+                f'bluesky_callback_latency_seconds{{{labels},quantile="0.5"}} {p50}'
+            )
+            lines.append(
+                f'bluesky_callback_latency_seconds{{{labels},quantile="0.99"}} {p99}'
+            )
+            lines.append(
+                f'bluesky_callback_latency_seconds{{{labels},quantile="1"}} {maximum}'
+            )
+        # Write and rename, so a scraper never reads a partial file.
+        path = Path(path)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
 
 # event_loop = asyncio.get_event_loop()
 # RE = RunEngine(loop=event_loop)
 RE = RunEngine()
+callback_profiler = CallbackProfiler(
+    metrics_file=os.environ.get("HEX_CALLBACK_METRICS_FILE")
+)
+callback_profiler.install(RE)
 RE.subscribe(bec)
 RE.preprocessors.append(sd)
 
-tiled_writing_client = from_uri(
-    "https://tiled.nsls2.bnl.gov/api/v1/metadata/hex/raw",
-    api_key=os.environ["TILED_BLUESKY_WRITING_API_KEY_HEX"],
-)
+
+def local_tiled_client(storage_dir=HEX_SIM_DATA_DIR / "tiled"):
+    """Client of an in-memory Tiled catalog served in-process (external files are read from HEX_SIM_DATA_DIR)."""
+    from tiled.catalog import from_uri as catalog_from_uri
+    from tiled.client import Context, from_context
+    from tiled.server.app import build_app
+
+    Path(storage_dir).mkdir(parents=True, exist_ok=True)
+    tiled_catalog = catalog_from_uri(
+        "sqlite+aiosqlite:///:memory:",
+        writable_storage=str(storage_dir),
+        readable_storage=[str(HEX_SIM_DATA_DIR)],
+        init_if_not_exists=True,
+    )
+    return from_context(Context.from_app(build_app(tiled_catalog)))
+
+
+with file_loading_timer.section("tiled_writing_client", category="tiled"):
+    if HEX_SIMULATION:
+        tiled_writing_client = local_tiled_client()
+    else:
+        tiled_writing_client = from_uri(
+            "https://tiled.nsls2.bnl.gov/api/v1/metadata/hex/raw",
+            api_key=os.environ["TILED_BLUESKY_WRITING_API_KEY_HEX"],
+        )
 tw = TiledWriter(tiled_writing_client)
-RE.subscribe(tw)
+# 'tw' is fed from the document spool, see 04-documents.py.
 
 # c = tiled_reading_client = from_uri(
 #     "https://tiled.nsls2.bnl.gov/api/v1/metadata/hex/raw",
@@ -120,38 +640,16 @@ RE.subscribe(tw)
 
 # db = Broker(c)
 
-import json
-
-
-class JSONWriter:
-    """Writer for a JSON array"""
-
-    def __init__(self, filepath):
-        self.file = open(filepath, "w")
-        self.file.write("[\n")
-
-    def __call__(self, name, doc):
-        json.dump({"name": name, "doc": doc}, self.file, default=str)
-        if name == "stop":
-            self.file.write("\n]")
-            self.file.close()
-        else:
-            self.file.write(",\n")
-
 
 def now():
     return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
-jlw = JSONWriter(f"/tmp/export-docs-{now()}.json")
-
-
-# wr = JSONWriter('/tmp/test.json')
-# RE.subscribe(wr)
+# Documents can be exported to files with 'jlw' (see 04-documents.py).
 
 # RE.subscribe(print)
 
-configure_kafka_publisher(RE, beamline_name="hex")
+# The Kafka publisher is fed from the document spool, see 04-documents.py.
 
 # This is needed for ophyd-async to enable 'await <>' instead of 'asyncio.run(<>)':
 get_ipython().run_line_magic("autoawait", "call_in_bluesky_event_loop")
@@ -163,13 +661,264 @@ bec.disable_baseline()
 
 runengine_metadata_dir = Path("/nsls2/data/hex/shared/config/runengine-metadata")
 
-RE.md = RedisJSONDict(redis.Redis("info.hex.nsls2.bnl.gov", 6379), prefix="")
 
+def _redis_json_default(value):
+    # The observable copies returned by RedisJSONDict, e.g. a nested dict changed in place
+    if isinstance(value, ObservableMapping):
+        return dict(value)
+    if isinstance(value, ObservableSequence):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _observe_json(value, on_changed):
+    """Recursively observable copy of a decoded value, as RedisJSONDict returns."""
+    if isinstance(value, dict):
+        return ObservableMapping(
+            {key: _observe_json(item, on_changed) for key, item in value.items()},
+            on_changed,
+        )
+    if isinstance(value, list):
+        return ObservableSequence(
+            [_observe_json(item, on_changed) for item in value], on_changed
+        )
+    return value
+
+
+class CachedRedisJSONDict(RedisJSONDict):
+    """
+    RedisJSONDict that serves reads of ``cached_keys`` from a local copy.
+
+    The path providers, the TIFF plugin and the prompt read ``cycle``,
+    ``data_session`` and ``scan_id`` many times per scan, so their encoded values
+    are kept in memory and only fetched again after they change; all other keys
+    are read from Redis as with RedisJSONDict. Changes made by other clients
+    (e.g. the queue server) are picked up with Redis keyspace notifications,
+    subscribed for the cached keys only. They have to be enabled on the server
+    (``notify-keyspace-events`` with ``K``, ``$`` and ``g``, see README.md);
+    without them nothing is cached.
+
+    Only the public API of RedisJSONDict is used; the client and prefix are kept
+    as ``redis_client`` and ``prefix``.
+    """
 
-# Optional: set any metadata that rarely changes.
-RE.md["facility"] = "NSLS-II"
-RE.md["group"] = "HEX"
-RE.md["beamline_id"] = "27-ID-1"
+    def __init__(self, redis_client, prefix, cached_keys=()):
+        super().__init__(redis_client, prefix)
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.cached_keys = frozenset(cached_keys)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        # Incremented by every invalidation, so that a value fetched (or written)
+        # while one arrived is not cached.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._pubsub_thread = None
+        self._transaction = threading.local()
+        self.notifications = self._subscribe_to_keyspace()
+
+    def _subscribe_to_keyspace(self):
+        if not self.cached_keys:
+            return False
+        client = self.redis_client
+        try:
+            events = client.config_get("notify-keyspace-events").get(
+                "notify-keyspace-events", ""
+            )
+            if (
+                "K" not in events
+                or not ({"A", "$"} & set(events))
+                or not ({"A", "g"} & set(events))
+            ):
+                print(
+                    "RE.md cache: keyspace notifications are not enabled on the Redis "
+                    f"server (notify-keyspace-events={events!r}, needs K$g, see "
+                    "README.md), RE.md is not cached."
+                )
+                return False
+            db = client.connection_pool.connection_kwargs.get("db", 0)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(
+                **{
+                    f"__keyspace@{db}__:{self.prefix}{key}": self._on_keyspace_event
+                    for key in self.cached_keys
+                }
+            )
+            self._pubsub_thread = pubsub.run_in_thread(
+                sleep_time=1.0, daemon=True, exception_handler=self._on_pubsub_error
+            )
+        except Exception as err:
+            print(
+                f"RE.md cache: keyspace notifications unavailable ({err}), "
+                "RE.md is not cached."
+            )
+            return False
+        return True
+
+    def _on_keyspace_event(self, message):
+        channel = message["channel"]
+        channel = channel.decode() if isinstance(channel, bytes) else channel
+        key = channel.split(":", 1)[1][len(self.prefix) :]
+        with self._cache_lock:
+            self.invalidations += 1
+            self._generation += 1
+            self._cache.pop(key, None)
+
+    def _on_pubsub_error(self, err, pubsub, thread):
+        # Without notifications the local copy can no longer be trusted.
+        print(
+            f"RE.md cache: lost keyspace notifications ({err}), RE.md is no longer cached."
+        )
+        thread.stop()
+        self.notifications = False
+        self.invalidate()
+
+    def invalidate(self):
+        with self._cache_lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def _cache_values(self, values, generation):
+        """Cache ``values`` read or written at ``generation``, unless invalidated since."""
+        with self._cache_lock:
+            if self.notifications and generation == self._generation:
+                self._cache.update(
+                    (key, json)
+                    for key, json in values.items()
+                    if key in self.cached_keys
+                )
+
+    def _encode(self, value):
+        return orjson.dumps(
+            value, default=_redis_json_default, option=orjson.OPT_SERIALIZE_NUMPY
+        )
+
+    def _write(self, encoded):
+        generation = self._generation
+        pipe = self.redis_client.pipeline(transaction=True)
+        for key, json in encoded.items():
+            pipe.set(f"{self.prefix}{key}", json)
+        pipe.execute()
+        self._cache_values(encoded, generation)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group the writes made inside the block into one MULTI/EXEC round trip.
+
+        Other clients see either none or all of the new values. Reads inside the
+        block see the pending values; nothing is written if the block raises.
+
+        >>> with RE.md.transaction():
+        ...     RE.md["current_dark_flat_scan_num"] = RE.md["scan_id"]
+        ...     RE.md["current_dark_flat_scan_uid"] = uid
+        """
+        if getattr(self._transaction, "pending", None) is not None:
+            yield self  # nested: the outermost block writes
+            return
+        self._transaction.pending = {}
+        try:
+            yield self
+            pending = self._transaction.pending
+        finally:
+            self._transaction.pending = None
+        if pending:
+            self._write(pending)
+
+    def _pending(self):
+        return getattr(self._transaction, "pending", None)
+
+    def __getitem__(self, key):
+        pending = self._pending()
+        json = pending.get(key) if pending else None
+        if json is None:
+            json = self._cache.get(key)
+            if json is None:
+                self.misses += 1
+                generation = self._generation
+                json = self.redis_client.get(f"{self.prefix}{key}")
+                if json is None:
+                    raise KeyError(key)
+                self._cache_values({key: json}, generation)
+            else:
+                self.hits += 1
+
+        def sync():
+            self[key] = observed
+
+        observed = _observe_json(orjson.loads(json), sync)
+        return observed
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        self.redis_client.delete(f"{self.prefix}{key}")
+        with self._cache_lock:
+            self._generation += 1
+            self._cache.pop(key, None)
+
+    def clear(self):
+        super().clear()
+        self.invalidate()
+
+    def update(self, d):
+        encoded = {key: self._encode(value) for key, value in d.items()}
+        pending = self._pending()
+        if pending is not None:
+            pending.update(encoded)
+        else:
+            self._write(encoded)
+
+    def cache_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "cached keys": len(self._cache),
+            "keyspace notifications": self.notifications,
+        }
+
+
+# Read many times per scan, see CachedRedisJSONDict.
+RE_MD_CACHED_KEYS = ("cycle", "data_session", "scan_id")
+
+with file_loading_timer.section("RE.md", category="redis"):
+    if HEX_SIMULATION:
+        try:
+            import fakeredis
+        except ImportError as err:
+            raise ImportError(
+                "The simulation profile keeps RE.md in an in-memory Redis and needs "
+                "the 'fakeredis' package: pip install fakeredis"
+            ) from err
+        RE.md = CachedRedisJSONDict(
+            fakeredis.FakeRedis(), prefix="", cached_keys=RE_MD_CACHED_KEYS
+        )
+        for key, value in {
+            "cycle": "sim",
+            "data_session": "pass-000000",
+            "scan_id": 0,
+        }.items():
+            RE.md.setdefault(key, value)
+    else:
+        RE.md = CachedRedisJSONDict(
+            redis.Redis("info.hex.nsls2.bnl.gov", 6379),
+            prefix="",
+            cached_keys=RE_MD_CACHED_KEYS,
+        )
+
+    # Optional: set any metadata that rarely changes.
+    RE.md["facility"] = "NSLS-II"
+    RE.md["group"] = "HEX"
+    RE.md["beamline_id"] = "27-ID-1"
+
+
+# Installed once RE.md exists, so that the first prompt already shows the session.
+ip = get_ipython()
+ip.prompts = ProposalIDPrompt(ip, RE.md)
 
 
 def warmup_hdf5_plugins(detectors):
@@ -206,9 +955,12 @@ def show_env():
     b = a.split("\n")
     print(b[0].split("/")[-1][:-1])
 
+
 from ophyd_async.core import config_ophyd_async_logging
+
 config_ophyd_async_logging()
 
+
 def print_docs(name, doc):
     print("============================")
     print(f"{name = }")
@@ -216,7 +968,8 @@ def print_docs(name, doc):
     print("============================")
 
 
-#RE.subscribe(print_docs)
+# RE.subscribe(print_docs)
+
 
 def reset_scan_id(scan_id=0):
     """A fake plan to reset the scan_id via qserver."""
@@ -226,4 +979,4 @@ def reset_scan_id(scan_id=0):
     print(f"Scan_id after: {RE.md['scan_id']}")
 
 
-file_loading_timer = FileLoadingTimer()
+file_loading_timer.stop_timer(__file__)
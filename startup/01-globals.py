@@ -2,26 +2,31 @@ file_loading_timer.start_timer(__file__)
 
 
 import asyncio
+import math
 from dataclasses import dataclass
 from enum import Enum
 
+from bluesky.utils import short_uid
 from ophyd import EpicsSignalRO
 from ophyd_async.core import (
     DEFAULT_TIMEOUT,
+    AsyncStatus,
     DetectorControl,
     DetectorTrigger,
     DetectorWriter,
     DeviceCollector,
-    StandardFlyer,
     SignalRW,
+    StandardDetector,
+    StandardFlyer,
     TriggerInfo,
     TriggerLogic,
 )
-from ophyd_async.core import AsyncStatus
-from ophyd_async.core import StandardDetector
-from ophyd_async.core import DeviceCollector
 
-HEX_PROPOSAL_DIR_ROOT = "/nsls2/data/hex/proposals"
+HEX_PROPOSAL_DIR_ROOT = (
+    str(HEX_SIM_DATA_DIR / "proposals")
+    if HEX_SIMULATION
+    else "/nsls2/data/hex/proposals"
+)
 
 
 class ScanType(Enum):
@@ -90,6 +95,230 @@ class StandardTriggerLogic(TriggerLogic[int]):
         self.state = StandardTriggerState.stopping
 
 
+class _FrameWatcher:
+    """
+    Follows the frames written by ``detectors`` and the completion of ``statuses``
+    for one collect_while_completing call.
+
+    The status callbacks and the subscriptions to the written indices are made
+    once, on the first wait(), and last until close().
+
+    The written indices come from the detectors' writers
+    (``StandardDetector._writer.observe_indices_written``, ophyd-async 0.3 to
+    0.6), which is not public API; see check().
+    """
+
+    @staticmethod
+    def check(detectors):
+        """Raise TypeError before the scan if a detector's written frames cannot be followed."""
+        for detector in detectors:
+            writer = getattr(detector, "_writer", None)
+            if not callable(getattr(writer, "observe_indices_written", None)):
+                raise TypeError(
+                    f"Cannot follow the frames written by {detector.name}: expected an "
+                    "ophyd-async StandardDetector with a writer providing "
+                    "observe_indices_written() (ophyd-async 0.3 to 0.6), got "
+                    f"{type(detector).__name__}."
+                )
+
+    def __init__(self, detectors, statuses):
+        self.detectors = detectors
+        self.statuses = statuses
+        self.written = {}  # detector name -> last index reported written
+        self._loop = None
+        self._changed = None
+        self._tasks = []
+
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._tasks = [
+            asyncio.ensure_future(self._follow(detector)) for detector in self.detectors
+        ]
+
+        def status_finished(status):
+            # Callbacks of ophyd statuses may run in other threads; failures are
+            # reported by the final bps.wait of the plan.
+            self._loop.call_soon_threadsafe(self._changed.set)
+
+        for status in self.statuses:
+            status.add_callback(status_finished)
+
+    async def _follow(self, detector):
+        async for index in detector._writer.observe_indices_written(timeout=None):
+            self.written[detector.name] = index
+            self._changed.set()
+
+    def _ready(self, collected, batch_frames):
+        return all(status.done for status in self.statuses) or any(
+            self.written.get(name, count) - count >= batch_frames
+            for name, count in collected.items()
+        )
+
+    async def wait(self, collected, batch_frames, max_latency):
+        """
+        Return once a detector wrote ``batch_frames`` frames past ``collected``, every
+        status is done, or ``max_latency`` seconds passed (whichever comes first).
+
+        Returns the indices written by each detector and whether all statuses are done.
+        """
+        if self._loop is None:
+            self._start()
+        deadline = self._loop.time() + max_latency
+        while True:
+            self._changed.clear()
+            timeout = deadline - self._loop.time()
+            if self._ready(collected, batch_frames) or timeout <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        # before reading the indices, so they include every frame
+        done = all(status.done for status in self.statuses)
+        indices = await asyncio.gather(
+            *(detector.get_index() for detector in self.detectors)
+        )
+        return dict(zip((detector.name for detector in self.detectors), indices)), done
+
+    def close(self):
+        """Stop following the detectors; may be called from any thread."""
+        if self._loop is not None:
+            for task in self._tasks:
+                self._loop.call_soon_threadsafe(task.cancel)
+
+
+def collect_while_completing(
+    flyers,
+    detectors,
+    stream_name,
+    max_latency=1.0,
+    batch_frames=None,
+    declare_streams=True,
+    group=None,
+):
+    """
+    Complete ``flyers`` and ``detectors`` and collect the detectors while they do.
+
+    Instead of polling, the plan sleeps until the detectors report new frames: it
+    collects (emitting stream_datum documents) once ``batch_frames`` new frames
+    landed on a detector, or at the latest every ``max_latency`` seconds while
+    frames keep arriving. By default the batch adapts to the frame rate so that
+    there is about one collect per ``max_latency`` seconds. A final collect is done
+    as soon as everything completed, so the plan returns right after the last frames.
+
+    Parameters
+    ----------
+    flyers : list
+        flyers (e.g. kinetix_flyer, panda_flyer) to complete, not collected
+    detectors : list
+        StandardDetectors to complete and collect
+    stream_name : str or callable
+        stream name, or a function of the detector returning it
+    max_latency : float
+        maximum time in seconds between frames landing and their stream_datum
+    batch_frames : int (optional)
+        fixed number of frames per collect, adaptive if None
+    declare_streams : bool
+        whether to declare the streams (once) before collecting
+    """
+    _FrameWatcher.check(detectors)
+    group = group or short_uid("collect_while_completing")
+    names = {
+        detector.name: stream_name(detector) if callable(stream_name) else stream_name
+        for detector in detectors
+    }
+    if declare_streams:
+        for detector in detectors:
+            yield from bps.declare_stream(detector, name=names[detector.name])
+
+    statuses = []
+    for obj in [*flyers, *detectors]:
+        statuses.append((yield from bps.complete(obj, group=group)))
+
+    collected = {detector.name: 0 for detector in detectors}
+    batch = batch_frames or 1
+    done = False
+    watcher = _FrameWatcher(detectors, statuses)
+    try:
+        while not done:
+            start = ttime.monotonic()
+            (waiter,) = yield from bps.wait_for(
+                [lambda: watcher.wait(collected, batch, max_latency)]
+            )
+            indices, done = waiter.result()
+            new_frames = max(
+                (indices[name] - collected[name] for name in indices), default=0
+            )
+            if batch_frames is None and new_frames:
+                # Frames per max_latency at the current rate
+                batch = max(
+                    1,
+                    int(
+                        new_frames * max_latency / max(ttime.monotonic() - start, 1e-3)
+                    ),
+                )
+            for detector in detectors:
+                if done or indices[detector.name] > collected[detector.name]:
+                    yield from bps.collect(detector, name=names[detector.name])
+            collected = indices
+    finally:
+        watcher.close()
+
+    yield from bps.wait(group=group)
+
+
+def _at_target(current, target, tolerance):
+    if isinstance(target, Enum):
+        target = target.value
+    if isinstance(current, Enum):
+        current = current.value
+    if isinstance(target, (int, float)) and isinstance(current, (int, float)):
+        return math.isclose(current, target, rel_tol=tolerance, abs_tol=tolerance)
+    return current == target
+
+
+def set_signals(settings, group=None, wait=True, tolerance=1e-9):
+    """
+    Set several independent signals concurrently and wait for them once.
+
+    The current values are read first and signals that are already at their
+    target are not written. ophyd-async signals are read concurrently, in one
+    round trip; ophyd signals are read one after the other with ``bps.rd``, so
+    re-applying an unchanged configuration costs one round trip plus one per
+    ophyd signal, and no writes.
+
+    Parameters
+    ----------
+    settings : dict or list of (signal, value) pairs
+    group : str (optional)
+        status group of the writes; other operations may be added to it
+    wait : bool
+        whether to wait for the group
+    tolerance : float
+        relative and absolute tolerance for numerical values
+    """
+    settings = list(settings.items()) if isinstance(settings, dict) else list(settings)
+    group = group or short_uid("set_signals")
+
+    async_signals = [signal for signal, _ in settings if hasattr(signal, "get_value")]
+    current = {}
+    if async_signals:
+        (values,) = yield from bps.wait_for(
+            [lambda: asyncio.gather(*(signal.get_value() for signal in async_signals))]
+        )
+        current.update(zip(map(id, async_signals), values.result()))
+    for signal, _ in settings:
+        if id(signal) not in current:
+            current[id(signal)] = yield from bps.rd(signal)
+
+    for signal, target in settings:
+        if not _at_target(current[id(signal)], target, tolerance):
+            yield from bps.abs_set(signal, target, group=group)
+    if wait:
+        yield from bps.wait(group=group)
+
+
 async def print_children(device):
     for name, obj in dict(device.children()).items():
         print(f"{name}: {await obj.read()}")
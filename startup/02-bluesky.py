@@ -1,9 +1,10 @@
 file_loading_timer.start_timer(__file__)
 
 
+import threading
+
 import ophyd
 from bluesky.plans import count
-from nslsii.ad33 import SingleTriggerV33, StatsPluginV33
 from ophyd import Component as Cpt
 from ophyd import EpicsSignal, EpicsSignalRO, Kind, Signal
 from ophyd.areadetector import AreaDetector, CamBase
@@ -27,5 +28,386 @@ from ophyd.areadetector.filestore_mixins import (
 )
 from ophyd.device import BlueskyInterface, Device, DeviceStatus
 from ophyd.status import SubscriptionStatus
+from ophyd_async.core import DEFAULT_TIMEOUT
+
+SingleTriggerV33 = lazy_import("nslsii.ad33", "SingleTriggerV33")
+StatsPluginV33 = lazy_import("nslsii.ad33", "StatsPluginV33")
+
+
+class DescriptionCache:
+    """
+    Cache of ``describe_configuration()`` and ``read_configuration()``.
+
+    Every run asks each device for its configuration, which costs one channel
+    access get per signal. Once a device is installed here, the results are kept
+    between runs and dropped as soon as a monitor reports a change: a new value of
+    a configuration signal (e.g. a motor velocity or the Kinetix exposure time) or
+    new metadata (units, precision, limits) of any signal. For ophyd v1 devices a
+    change of ``configuration_attrs`` (kinds) also invalidates the cache.
+
+    ``describe()`` is not cached: it has to match what ``read()`` returns, which
+    also depends on ``read_attrs`` and on array sizes.
+    """
+
+    _CACHED_METHODS = ("describe_configuration", "read_configuration")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def install(self, device):
+        """Cache the descriptions of ``device`` (and of its sub-devices)."""
+        if id(device) in self._entries:
+            return
+        entry = self._entries[id(device)] = {}
+        if isinstance(device, ophyd.ophydobj.OphydObject):
+            self._install_v1(device, entry)
+        else:
+            self._install_async(device, entry)
+
+    def _wrap(self, method_name, method, entry, key=lambda: None):
+        def cached(*args, **kwargs):
+            current_key = key()
+            if method_name in entry and entry[method_name][0] == current_key:
+                self.hits += 1
+                return entry[method_name][1]
+            self.misses += 1
+            result = method(*args, **kwargs)
+            entry[method_name] = (current_key, result)
+            return result
+
+        return cached
+
+    def _wrap_async(self, method_name, method, entry):
+        async def cached(*args, **kwargs):
+            if method_name in entry:
+                self.hits += 1
+                return entry[method_name]
+            self.misses += 1
+            result = entry[method_name] = await method(*args, **kwargs)
+            return result
+
+        return cached
+
+    def _install_v1(self, device, entry):
+        def invalidate_configuration(*args, **kwargs):
+            entry.pop("describe_configuration", None)
+            entry.pop("read_configuration", None)
+
+        def invalidate_all(*args, **kwargs):
+            entry.clear()
+
+        if isinstance(device, ophyd.signal.Signal):
+            signals = [device]
+        else:
+            signals = [walk.item for walk in device.walk_signals()]
+        for signal in signals:
+            signal.subscribe(invalidate_all, event_type=signal.SUB_META, run=False)
+            if signal.kind & Kind.config:
+                signal.subscribe(
+                    invalidate_configuration, event_type=signal.SUB_VALUE, run=False
+                )
+
+        def configuration_attrs():
+            return tuple(getattr(device, "configuration_attrs", ()))
+
+        for method_name in self._CACHED_METHODS:
+            setattr(
+                device,
+                method_name,
+                self._wrap(
+                    method_name,
+                    getattr(device, method_name),
+                    entry,
+                    configuration_attrs,
+                ),
+            )
+
+        for sub_device_name in getattr(device, "_sub_devices", []):
+            self.install(getattr(device, sub_device_name))
+
+    def _install_async(self, device, entry):
+        def invalidate_configuration(*args, **kwargs):
+            entry.pop("describe_configuration", None)
+
+        # Subscribing also makes read_configuration() use the monitored values.
+        for signal in getattr(device, "_config_sigs", []):
+            signal.subscribe_value(invalidate_configuration)
+
+        device.describe_configuration = self._wrap_async(
+            "describe_configuration", device.describe_configuration, entry
+        )
+
+    def clear(self):
+        for entry in self._entries.values():
+            entry.clear()
+
+    def stats(self):
+        return {"devices": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+description_cache = DescriptionCache()
+
+
+class AsyncDeviceRegistry:
+    """
+    Registry of ophyd-async devices which are connected together in one startup stage.
+
+    Devices are registered with a factory (a callable returning an unconnected device)
+    under the name they should have in the user namespace. ``connect()`` then builds
+    and connects all of them concurrently, each with its own deadline, so a missing
+    IOC only costs its own timeout instead of delaying every device after it.
+
+    With ``mock=True`` the devices are connected to mock signals and the optional
+    ``simulation`` coroutine function given at registration is awaited on them.
+    """
+
+    def __init__(self, mock=False):
+        self.mock = mock
+        self._factories = {}
+        self._simulations = {}
+        self.devices = {}
+        self.connection_times = {}
+        self.failures = {}
+
+    def register(self, name, factory, simulation=None):
+        self._factories[name] = factory
+        if simulation is not None:
+            self._simulations[name] = simulation
+
+    async def _connect_one(self, name, timeout):
+        start_time = ttime.monotonic()
+        try:
+            device = self.devices.get(name)
+            if device is None:
+                device = self._factories[name]()
+            await asyncio.wait_for(
+                device.connect(mock=self.mock, timeout=timeout), timeout=timeout
+            )
+            if self.mock and name in self._simulations:
+                await self._simulations[name](device)
+        except Exception as e:
+            self.failures[name] = e
+            self.devices.pop(name, None)
+        else:
+            self.failures.pop(name, None)
+            self.devices[name] = device
+            description_cache.install(device)
+        self.connection_times[name] = ttime.monotonic() - start_time
+
+    async def _connect_all(self, names, timeout):
+        await asyncio.gather(*[self._connect_one(name, timeout) for name in names])
+
+    def connect(self, names=None, timeout=DEFAULT_TIMEOUT, namespace=None):
+        """
+        Connect the registered devices concurrently.
+
+        Parameters
+        ----------
+        names: list, optional
+            names of the devices to (re)connect, all registered devices by default.
+        timeout: float
+            per-device connection deadline, in seconds.
+        namespace: dict, optional
+            namespace to bind the connected devices into, the IPython user namespace by default.
+        """
+        if names is None:
+            names = list(self._factories)
+        if namespace is None:
+            namespace = get_ipython().user_ns
+
+        with file_loading_timer.section(
+            "async device connection", category="pv connection"
+        ):
+            call_in_bluesky_event_loop(self._connect_all(names, timeout))
+
+        for name in names:
+            if name in self.devices:
+                namespace[name] = self.devices[name]
+            else:
+                namespace.pop(name, None)
+
+        self.report(names)
+        return {name: self.devices[name] for name in names if name in self.devices}
+
+    def report(self, names=None):
+        if names is None:
+            names = list(self._factories)
+        print("Device connection report:")
+        for name in names:
+            status = "connected" if name in self.devices else "UNAVAILABLE"
+            print(
+                f"    {name:15}: {status:12} in {self.connection_times.get(name, 0):.3f} seconds"
+            )
+            if name in self.failures:
+                print(
+                    f"        {type(self.failures[name]).__name__}: {self.failures[name]}"
+                )
+
+
+async_device_registry = AsyncDeviceRegistry(mock=HEX_SIMULATION)
+
+
+def connect_async_devices(names=None, timeout=DEFAULT_TIMEOUT):
+    """Connect (or retry connecting) the ophyd-async devices registered at startup."""
+    return async_device_registry.connect(names=names, timeout=timeout)
+
+
+class LazyDevice:
+    """
+    Proxy for an ophyd device which is only built and connected when first used.
+
+    Building an ophyd v1 device creates (and starts searching for) all of its PVs,
+    so the proxy defers calling ``factory`` until an attribute of the device is
+    accessed, e.g. by a plan reading, staging or moving it. After that, the proxy
+    forwards attribute access to the real device. ``isinstance``, equality and
+    hashing are those of the proxy itself, so they never connect the device.
+
+    If the device cannot be built or connected, ``unavailable_message`` (or a
+    generic one) is printed and the failure is remembered: further uses raise a
+    ConnectionError right away instead of waiting for the connection timeout
+    again, until the device is reconnected with ``lazy_devices.connect_all()``.
+    """
+
+    def __init__(self, factory, name, connection_timeout=10, unavailable_message=None):
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_connection_timeout", connection_timeout)
+        object.__setattr__(self, "_lazy_unavailable_message", unavailable_message)
+        object.__setattr__(self, "_lazy_target", None)
+        object.__setattr__(self, "_lazy_connected", False)
+        object.__setattr__(self, "_lazy_error", None)
+        object.__setattr__(self, "_lazy_lock", threading.RLock())
+
+    def _lazy_build(self):
+        with self._lazy_lock:
+            if self._lazy_target is None:
+                with file_loading_timer.section(
+                    self._lazy_name, category="device construction"
+                ):
+                    object.__setattr__(self, "_lazy_target", self._lazy_factory())
+            return self._lazy_target
+
+    def _lazy_resolve(self, warn=True):
+        with self._lazy_lock:
+            if self._lazy_error is not None:
+                raise ConnectionError(
+                    f"{self._lazy_name} is not connected ({self._lazy_error!r}), "
+                    f"retry with lazy_devices.connect_all([{self._lazy_name!r}])"
+                ) from self._lazy_error
+            try:
+                target = self._lazy_build()
+                if not self._lazy_connected:
+                    if hasattr(target, "wait_for_connection"):
+                        with file_loading_timer.section(
+                            self._lazy_name, category="pv connection"
+                        ):
+                            target.wait_for_connection(
+                                timeout=self._lazy_connection_timeout
+                            )
+                    description_cache.install(target)
+                    object.__setattr__(self, "_lazy_connected", True)
+            except Exception as e:
+                object.__setattr__(self, "_lazy_error", e)
+                if warn:
+                    print(
+                        self._lazy_unavailable_message
+                        or f"{self._lazy_name} not connected ({type(e).__name__}: {e})"
+                    )
+                raise
+            return target
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._lazy_resolve(), attr, value)
+
+    def __dir__(self):
+        return dir(self._lazy_resolve())
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_resolve()(*args, **kwargs)
+
+    # Identity of the proxy: comparing or hashing must not connect the device.
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+    def __repr__(self):
+        if self._lazy_error is not None:
+            return f"<LazyDevice {self._lazy_name!r} (unavailable)>"
+        if self._lazy_target is None:
+            return f"<LazyDevice {self._lazy_name!r} (not connected)>"
+        return repr(self._lazy_target)
+
+
+class LazyDeviceRegistry:
+    """Keeps track of the lazily built ophyd v1 devices of the profile."""
+
+    def __init__(self):
+        self.devices = {}
+
+    def register(self, name, factory, connection_timeout=10, unavailable_message=None):
+        """Return a proxy for the device built by ``factory`` on first use."""
+        device = LazyDevice(
+            factory,
+            name,
+            connection_timeout=connection_timeout,
+            unavailable_message=unavailable_message,
+        )
+        self.devices[name] = device
+        return device
+
+    def connected(self):
+        return [name for name, device in self.devices.items() if device._lazy_connected]
+
+    def connect_all(self, names=None, timeout=10):
+        """
+        Build and connect every registered device (or those in ``names``), e.g.
+        for the queue server which has to validate all devices up front.
+        Devices which failed to connect before are tried again.
+
+        All devices are built before waiting on any of them, so the channel
+        access searches for their PVs run in parallel.
+        """
+        devices = {
+            name: device
+            for name, device in self.devices.items()
+            if names is None or name in names
+        }
+        failures = {}
+        for name, device in devices.items():
+            object.__setattr__(device, "_lazy_error", None)
+            try:
+                device._lazy_build()
+            except Exception as e:
+                failures[name] = e
+
+        for name, device in devices.items():
+            if name in failures:
+                object.__setattr__(device, "_lazy_error", failures[name])
+                continue
+            object.__setattr__(device, "_lazy_connection_timeout", timeout)
+            try:
+                device._lazy_resolve(warn=False)
+            except Exception as e:
+                failures[name] = e
+
+        for name, e in failures.items():
+            print(f"    {name:20}: UNAVAILABLE ({type(e).__name__}: {e})")
+        return failures
+
+
+lazy_devices = LazyDeviceRegistry()
+
+
+def connect_all(names=None, timeout=10):
+    """Build and connect all (or ``names`` of the) lazily created ophyd v1 devices."""
+    return lazy_devices.connect_all(names=names, timeout=timeout)
+
 
 file_loading_timer.stop_timer(__file__)
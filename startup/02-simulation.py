@@ -0,0 +1,417 @@
+"""
+Simulated backends for running the profile off the beamline.
+
+With ``HEX_PROFILE_SIMULATION=1`` the startup files build the same devices,
+under the same names, but:
+
+- ophyd v1 motors are ``SimEpicsMotor`` objects moving with their velocity and
+  acceleration, other EPICS signals are ``ophyd.sim`` fake signals;
+- the Kinetix detectors and the PandA are connected with ``mock=True`` and driven
+  by ``SimKinetix``/``SimPandA``, which write real HDF5 files under
+  ``HEX_SIM_DATA_DIR``. The PandA pulses trigger the Kinetix frames, subject to
+  the readout-mode framerate limits in ``DETECTOR_MAX_FRAMERATES``;
+- the GeRM detector is a ``SimGeRMDetector`` counting for ``count_time``.
+- RE.md is stored in an in-memory ``fakeredis`` server (required).
+"""
+
+file_loading_timer.start_timer(__file__)
+
+import math
+import threading
+
+import numpy as np
+from ophyd import Component as Cpt
+from ophyd import Device, Signal
+from ophyd.device import DeviceStatus
+from ophyd_async.core import callback_on_mock_put, set_mock_value, soft_signal_rw
+from ophyd_async.epics.adcore import ADBaseDataType, ImageMode
+from ophyd_async.epics.adkinetix._kinetix_io import KinetixTriggerMode
+from ophyd_async.fastcs.panda import PandaHdf5DatasetType
+
+h5py = lazy_import("h5py")
+
+SIM_MOTOR_VELOCITY = 5.0
+SIM_MOTOR_ACCELERATION = 0.2  # seconds to reach the velocity, as the EPICS ACCL field
+SIM_MOTOR_UPDATE_PERIOD = 0.02
+
+# The real sensor is 3200x3200, a smaller frame keeps the simulation laptop-friendly.
+SIM_KINETIX_FRAME_SHAPE = (256, 256)
+SIM_KINETIX_DEFAULT_MAX_FRAMERATE = 80
+
+SIM_PANDA_DATASETS = ["Angle", "Timestamp"]
+SIM_PANDA_POLL_PERIOD = 0.001
+
+SIM_GERM_CHANNELS = 4096
+
+
+class SimEpicsMotor(Device):
+    """Soft motor with the EpicsMotor API and a trapezoidal velocity profile."""
+
+    user_readback = Cpt(Signal, value=0.0, kind="hinted")
+    user_setpoint = Cpt(Signal, value=0.0, kind="normal")
+    velocity = Cpt(Signal, value=SIM_MOTOR_VELOCITY, kind="config")
+    acceleration = Cpt(Signal, value=SIM_MOTOR_ACCELERATION, kind="config")
+    motor_egu = Cpt(Signal, value="mm", kind="config")
+    motor_is_moving = Cpt(Signal, value=0, kind="omitted")
+
+    def __init__(self, prefix="", *, name, **kwargs):
+        super().__init__(prefix, name=name, **kwargs)
+        self.user_readback.name = self.name
+        self._stop_event = threading.Event()
+        self._move_thread = None
+
+    @property
+    def position(self):
+        return self.user_readback.get()
+
+    @property
+    def egu(self):
+        return self.motor_egu.get()
+
+    @property
+    def moving(self):
+        return bool(self.motor_is_moving.get())
+
+    def _profile(self, distance):
+        """Return the move duration and the position offset as a function of time."""
+        velocity = abs(self.velocity.get()) or SIM_MOTOR_VELOCITY
+        accel_time = max(self.acceleration.get(), 1e-6)
+        accel = velocity / accel_time
+        if distance == 0:
+            return 0.0, lambda t: 0.0
+        if abs(distance) < velocity * accel_time:
+            # Triangular profile, the motor never reaches the velocity.
+            accel_time = math.sqrt(abs(distance) / accel)
+            velocity = accel * accel_time
+        duration = 2 * accel_time + (abs(distance) - velocity * accel_time) / velocity
+
+        def offset(t):
+            if t < accel_time:
+                travelled = 0.5 * accel * t**2
+            elif t < duration - accel_time:
+                travelled = 0.5 * accel * accel_time**2 + velocity * (t - accel_time)
+            else:
+                travelled = abs(distance) - 0.5 * accel * (duration - t) ** 2
+            return math.copysign(min(travelled, abs(distance)), distance)
+
+        return duration, offset
+
+    def set(self, value, **kwargs):
+        self.stop()
+        status = DeviceStatus(self)
+        start = self.user_readback.get()
+        duration, offset = self._profile(value - start)
+        self.user_setpoint.put(value)
+        self.motor_is_moving.put(1)
+        self._stop_event = stop_event = threading.Event()
+
+        def move():
+            start_time = ttime.monotonic()
+            while (elapsed := ttime.monotonic() - start_time) < duration:
+                if stop_event.wait(SIM_MOTOR_UPDATE_PERIOD):
+                    self.motor_is_moving.put(0)
+                    status.set_exception(RuntimeError(f"{self.name} was stopped"))
+                    return
+                self.user_readback.put(start + offset(min(elapsed, duration)))
+            self.user_readback.put(value)
+            self.motor_is_moving.put(0)
+            status.set_finished()
+
+        self._move_thread = threading.Thread(target=move, daemon=True)
+        self._move_thread.start()
+        return status
+
+    def move(self, value, wait=True, **kwargs):
+        status = self.set(value)
+        if wait:
+            status.wait()
+        return status
+
+    def stop(self, *, success=False):
+        self._stop_event.set()
+
+
+class SimGeRMDetector(Device):
+    """Counts for ``count_time`` and reads back a Poisson spectrum."""
+
+    count_time = Cpt(Signal, value=1.0, kind="config")
+    count = Cpt(Signal, value="Done", kind="omitted")
+    spectrum = Cpt(Signal, value=np.zeros(SIM_GERM_CHANNELS), kind="normal")
+
+    def __init__(self, prefix="", *, name, **kwargs):
+        super().__init__(prefix, name=name, **kwargs)
+
+    def trigger(self):
+        status = DeviceStatus(self)
+        self.count.put("Count")
+
+        def acquire():
+            ttime.sleep(self.count_time.get())
+            self.spectrum.put(
+                np.random.poisson(10 * self.count_time.get(), SIM_GERM_CHANNELS)
+            )
+            self.count.put("Done")
+            status.set_finished()
+
+        threading.Thread(target=acquire, daemon=True).start()
+        return status
+
+
+class SimTriggerBus:
+    """Delivers the simulated PandA pulses to the armed, externally triggered detectors."""
+
+    def __init__(self):
+        self._queues = set()
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self._queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._queues.discard(queue)
+
+    def fire(self):
+        timestamp = ttime.monotonic()
+        for queue in self._queues:
+            queue.put_nowait(timestamp)
+
+
+sim_trigger_bus = SimTriggerBus()
+
+
+class SimKinetix:
+    """Drives a mock-connected Kinetix: frame timing, HDF5 writing and capture counters."""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.drv = detector.drv
+        self.hdf = detector.hdf
+        self.dropped_frames = 0
+        self._acquisition = None
+        self._file = None
+
+    def setup(self):
+        set_mock_value(self.drv.array_size_y, SIM_KINETIX_FRAME_SHAPE[0])
+        set_mock_value(self.drv.array_size_x, SIM_KINETIX_FRAME_SHAPE[1])
+        set_mock_value(self.drv.data_type, ADBaseDataType.UInt16)
+        set_mock_value(self.hdf.file_path_exists, True)
+        callback_on_mock_put(self.hdf.file_path, self._on_file_path)
+        callback_on_mock_put(self.hdf.capture, self._on_capture)
+        callback_on_mock_put(self.drv.acquire, self._on_acquire)
+
+    def _on_file_path(self, value, **kwargs):
+        os.makedirs(value, exist_ok=True)
+
+    async def _on_capture(self, value, **kwargs):
+        if not value:
+            self._close_file()
+            return
+        path = (
+            Path(await self.hdf.file_path.get_value())
+            / f"{await self.hdf.file_name.get_value()}.h5"
+        )
+        self._file = h5py.File(path, "w")
+        self._file.create_dataset(
+            "/entry/data/data",
+            shape=(0, *SIM_KINETIX_FRAME_SHAPE),
+            maxshape=(None, *SIM_KINETIX_FRAME_SHAPE),
+            chunks=(1, *SIM_KINETIX_FRAME_SHAPE),
+            dtype="<u2",
+        )
+        set_mock_value(self.hdf.full_file_name, str(path))
+        set_mock_value(self.hdf.num_captured, 0)
+        set_mock_value(self.hdf.capture, True)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        set_mock_value(self.hdf.capture, False)
+
+    def _on_acquire(self, value, **kwargs):
+        if self._acquisition is not None:
+            self._acquisition.cancel()
+            self._acquisition = None
+        if value:
+            self._acquisition = asyncio.ensure_future(self._acquire())
+
+    async def _write_frame(self):
+        set_mock_value(
+            self.drv.array_counter, await self.drv.array_counter.get_value() + 1
+        )
+        if self._file is None:
+            return
+        dataset = self._file["/entry/data/data"]
+        dataset.resize(dataset.shape[0] + 1, axis=0)
+        dataset[-1] = np.random.poisson(100, SIM_KINETIX_FRAME_SHAPE).astype("<u2")
+        self._file.flush()
+        num_captured = dataset.shape[0]
+        set_mock_value(self.hdf.num_captured, num_captured)
+        num_capture = await self.hdf.num_capture.get_value()
+        if num_capture and num_captured >= num_capture:
+            self._close_file()
+
+    async def _acquire(self):
+        exposure = await self.drv.acquire_time.get_value()
+        max_framerate = DETECTOR_MAX_FRAMERATES.get(
+            await self.drv.readout_port_idx.get_value(),
+            SIM_KINETIX_DEFAULT_MAX_FRAMERATE,
+        )
+        min_period = max(exposure, 1 / max_framerate)
+        if await self.drv.image_mode.get_value() == ImageMode.continuous:
+            num_frames = math.inf
+        else:
+            num_frames = await self.drv.num_images.get_value()
+
+        frames = 0
+        if await self.drv.trigger_mode.get_value() == KinetixTriggerMode.internal:
+            while frames < num_frames:
+                await asyncio.sleep(min_period)
+                await self._write_frame()
+                frames += 1
+        else:
+            triggers = sim_trigger_bus.subscribe()
+            last_frame_time = -math.inf
+            try:
+                while frames < num_frames:
+                    trigger_time = await triggers.get()
+                    if trigger_time - last_frame_time < min_period:
+                        # Triggered faster than the readout mode allows.
+                        self.dropped_frames += 1
+                        continue
+                    last_frame_time = trigger_time
+                    await self._write_frame()
+                    frames += 1
+            finally:
+                sim_trigger_bus.unsubscribe(triggers)
+        set_mock_value(self.drv.acquire, False)
+        self._acquisition = None
+
+
+class SimPandA:
+    """
+    Drives a mock-connected PandA: PCOMP waits for the rotary stage to reach the
+    start position, then the pulse generator (or PCOMP itself for position triggering)
+    emits pulses which trigger the Kinetix detectors and are captured into HDF5.
+    """
+
+    def __init__(self, panda):
+        self.panda = panda
+        self.pcomp = dict(panda.pcomp.children())["1"]
+        self.pulse = dict(panda.pulse.children())["1"]
+        self._run = None
+        self._file = None
+
+    async def setup(self):
+        # The PVI of the real PandA has more fields than the common-block annotations.
+        for attr, datatype in [("pulses", int), ("step", float)]:
+            if not hasattr(self.pulse, attr):
+                signal = soft_signal_rw(datatype, initial_value=datatype(0))
+                await signal.connect()
+                setattr(self.pulse, attr, signal)
+                signal.set_name(f"{self.pulse.name}-{attr}")
+                signal.parent = self.pulse
+
+        set_mock_value(self.panda.data.directory_exists, True)
+        set_mock_value(
+            self.panda.data.datasets,
+            {
+                "name": np.array(SIM_PANDA_DATASETS),
+                "hdf5_type": [PandaHdf5DatasetType.FLOAT_64] * len(SIM_PANDA_DATASETS),
+            },
+        )
+        callback_on_mock_put(self.panda.data.hdf_directory, self._on_hdf_directory)
+        callback_on_mock_put(self.panda.data.capture, self._on_capture)
+        callback_on_mock_put(self.panda.pcap.arm, self._on_arm)
+
+    def _on_hdf_directory(self, value, **kwargs):
+        os.makedirs(value, exist_ok=True)
+
+    async def _on_capture(self, value, **kwargs):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if value:
+            data = self.panda.data
+            path = (
+                Path(await data.hdf_directory.get_value())
+                / await data.hdf_file_name.get_value()
+            )
+            self._file = h5py.File(path, "w")
+            for dataset_name in SIM_PANDA_DATASETS:
+                self._file.create_dataset(
+                    dataset_name, shape=(0,), maxshape=(None,), dtype="<f8"
+                )
+            set_mock_value(data.num_captured, 0)
+
+    def _on_arm(self, value, **kwargs):
+        if self._run is not None:
+            self._run.cancel()
+            self._run = None
+        set_mock_value(self.panda.pcap.active, bool(value))
+        if value:
+            self._run = asyncio.ensure_future(self._acquire())
+
+    def _pulse(self, start_time):
+        sim_trigger_bus.fire()
+        if self._file is None:
+            return
+        row = {
+            "Angle": tomo_rot_axis.user_readback.get(),
+            "Timestamp": ttime.monotonic() - start_time,
+        }
+        for dataset_name in SIM_PANDA_DATASETS:
+            dataset = self._file[dataset_name]
+            dataset.resize(dataset.shape[0] + 1, axis=0)
+            dataset[-1] = row[dataset_name]
+        self._file.flush()
+        set_mock_value(
+            self.panda.data.num_captured, self._file[SIM_PANDA_DATASETS[0]].shape[0]
+        )
+
+    async def _wait_for_angle(self, angle, negative):
+        while True:
+            position = tomo_rot_axis.user_readback.get()
+            if (position <= angle) if negative else (position >= angle):
+                return
+            await asyncio.sleep(SIM_PANDA_POLL_PERIOD)
+
+    async def _acquire(self):
+        negative = await self.pcomp.dir.get_value() == "Negative"
+        start_angle = (
+            await self.pcomp.start.get_value() + ZERO_OFFSET
+        ) / COUNTS_PER_DEG
+        pcomp_pulses = await self.pcomp.pulses.get_value()
+
+        await self._wait_for_angle(start_angle, negative)
+        start_time = ttime.monotonic()
+        if pcomp_pulses <= 1:
+            # Time-based triggering from the pulse generator.
+            step = await self.pulse.step.get_value()
+            for i in range(await self.pulse.pulses.get_value()):
+                await asyncio.sleep(max(0, start_time + i * step - ttime.monotonic()))
+                self._pulse(start_time)
+        else:
+            step_angle = await self.pcomp.step.get_value() / COUNTS_PER_DEG
+            for i in range(pcomp_pulses):
+                await self._wait_for_angle(
+                    start_angle + (-i if negative else i) * step_angle, negative
+                )
+                self._pulse(start_time)
+
+        set_mock_value(self.panda.pcap.active, False)
+        self._run = None
+
+
+async def simulate_kinetix(detector):
+    detector.simulation = SimKinetix(detector)
+    detector.simulation.setup()
+
+
+async def simulate_panda(panda):
+    panda.simulation = SimPandA(panda)
+    await panda.simulation.setup()
+
+
+file_loading_timer.stop_timer(__file__)
@@ -5,14 +5,28 @@ Ophyd objects for motors
 
 """
 
+import threading
+
 from ophyd import Component as Cpt
-from ophyd import Device, EpicsMotor, EpicsSignalRO, Kind
+from ophyd import Device, EpicsMotor, EpicsSignal, EpicsSignalRO, Kind
+from ophyd.device import DeviceStatus
+
+# The classes of the devices below; in simulation mode the same devices (and names)
+# without channel access, see 02-simulation.py. Aliased locally so that the other
+# startup files and the session keep the real ophyd classes.
+if HEX_SIMULATION:
+    from ophyd.sim import FakeEpicsSignal as _EpicsSignal
+    from ophyd.sim import FakeEpicsSignalRO as _EpicsSignalRO
+
+    _EpicsMotor = SimEpicsMotor
+else:
+    _EpicsSignal, _EpicsSignalRO, _EpicsMotor = EpicsSignal, EpicsSignalRO, EpicsMotor
 
 
-class EpicsMotorWithDescription(EpicsMotor):
+class EpicsMotorWithDescription(_EpicsMotor):
     """Based on the Misc. chapter at https://epics.anl.gov/EpicsDocumentation/AppDevManuals/RecordRef/Recordref-6.html."""
 
-    desc = Cpt(EpicsSignalRO, ".DESC", kind=Kind.config)
+    desc = Cpt(_EpicsSignalRO, ".DESC", kind=Kind.config)
 
 
 class SampleTower(Device):
@@ -73,17 +87,21 @@ class SampleTower(Device):
 
 
 class HEXMonochromator(Device):
-    xtal2_z = Cpt(EpicsMotor, "Z2}Mtr")
+    xtal2_z = Cpt(_EpicsMotor, "Z2}Mtr")
 
 
-mono = HEXMonochromator("XF:27IDA-OP:1{Mono:DCLM-Ax:", name="mono")
-sample_tower = SampleTower("XF:27IDF-OP:1{SMPL:1-Ax:", name="sample_tower")
+mono = lazy_devices.register(
+    "mono", lambda: HEXMonochromator("XF:27IDA-OP:1{Mono:DCLM-Ax:", name="mono")
+)
+sample_tower = lazy_devices.register(
+    "sample_tower", lambda: SampleTower("XF:27IDF-OP:1{SMPL:1-Ax:", name="sample_tower")
+)
 
 
 class TomoRotaryStageHoming(Device):
 
-    home_cmd = Cpt(EpicsSignal, "Start:Home-Cmd")
-    home_status = Cpt(EpicsSignal, "Sts:HomeCmplt-Sts")
+    home_cmd = Cpt(_EpicsSignal, "Start:Home-Cmd")
+    home_status = Cpt(_EpicsSignal, "Sts:HomeCmplt-Sts")
 
     def set(self, value):
         def wait_for_home_done(value, old_value, **kwargs):
@@ -92,10 +110,12 @@ class TomoRotaryStageHoming(Device):
                 return True
             else:
                 return False
-        
-        status = SubscriptionStatus(self.home_status, run=False, callback=wait_for_home_done)
+
+        status = SubscriptionStatus(
+            self.home_status, run=False, callback=wait_for_home_done
+        )
         self.home_cmd.put(value)
-        
+
         return status
 
 
@@ -104,21 +124,33 @@ class TomoRotaryStage(Device):
     home = Cpt(TomoRotaryStageHoming, "Ax:4}")
 
 
+def make_tomo_rotary_stage():
+    stage = TomoRotaryStage("XF:27IDF-OP:1{MC:5-", name="tomo_rotary_stage")
+    if HEX_SIMULATION:
+
+        def finish_homing(value, **kwargs):
+            if value:
+                stage.home.home_status.sim_put(0)
+                stage.rotary_axis.user_readback.put(0.0)
+                stage.home.home_status.sim_put(1)
+
+        stage.home.home_cmd.subscribe(finish_homing, run=False)
+    return stage
 
 
-tomo_rotary_stage = TomoRotaryStage("XF:27IDF-OP:1{MC:5-", name="tomo_rotary_stage")
-tomo_rot_axis = tomo_rotary_stage.rotary_axis
+tomo_rotary_stage = lazy_devices.register("tomo_rotary_stage", make_tomo_rotary_stage)
+tomo_rot_axis = LazyDevice(lambda: tomo_rotary_stage.rotary_axis, name="tomo_rot_axis")
 
 
 class MotorValuesMCA1(Device):
-    fltr1u = Cpt(EpicsSignalRO, "1{Fltr:1-Ax:Yu}Mtr.RBV", kind=Kind.normal)
-    fltr1d = Cpt(EpicsSignalRO, "1{Fltr:1-Ax:Yd}Mtr.RBV", kind=Kind.normal)
-    fltr2 = Cpt(EpicsSignalRO, "1{Fltr:2-Ax:Y}Mtr.RBV", kind=Kind.normal)
-    fltr3 = Cpt(EpicsSignalRO, "3{Fltr:3-Ax:Y}Mtr.RBV", kind=Kind.normal)
-    sliti = Cpt(EpicsSignalRO, "1{Slt:1-Ax:I}Mtr.RBV", kind=Kind.normal)
-    slito = Cpt(EpicsSignalRO, "1{Slt:1-Ax:O}Mtr.RBV", kind=Kind.normal)
-    slitb = Cpt(EpicsSignalRO, "1{Slt:1-Ax:B}Mtr.RBV", kind=Kind.normal)
-    slitt = Cpt(EpicsSignalRO, "1{Slt:1-Ax:T}Mtr.RBV", kind=Kind.normal)
+    fltr1u = Cpt(_EpicsSignalRO, "1{Fltr:1-Ax:Yu}Mtr.RBV", kind=Kind.normal)
+    fltr1d = Cpt(_EpicsSignalRO, "1{Fltr:1-Ax:Yd}Mtr.RBV", kind=Kind.normal)
+    fltr2 = Cpt(_EpicsSignalRO, "1{Fltr:2-Ax:Y}Mtr.RBV", kind=Kind.normal)
+    fltr3 = Cpt(_EpicsSignalRO, "3{Fltr:3-Ax:Y}Mtr.RBV", kind=Kind.normal)
+    sliti = Cpt(_EpicsSignalRO, "1{Slt:1-Ax:I}Mtr.RBV", kind=Kind.normal)
+    slito = Cpt(_EpicsSignalRO, "1{Slt:1-Ax:O}Mtr.RBV", kind=Kind.normal)
+    slitb = Cpt(_EpicsSignalRO, "1{Slt:1-Ax:B}Mtr.RBV", kind=Kind.normal)
+    slitt = Cpt(_EpicsSignalRO, "1{Slt:1-Ax:T}Mtr.RBV", kind=Kind.normal)
 
 
 """
@@ -199,7 +231,7 @@ MCF4_MOTORS = [
     "XF:27IDF-OP:1{SMPL:1-Ax:Y}Mtr.RBV",
     "XF:27IDF-OP:1{SMPL:1-Ax:Rz}Mtr.RBV",
     "XF:27IDF-OP:1{SMPL:1-Ax:X1}Mtr.RBV",
-    "XF:27IDF-OP:1{SMPL:1-Ax:Z1}Mtr.RBV",    
+    "XF:27IDF-OP:1{SMPL:1-Ax:Z1}Mtr.RBV",
     "XF:27IDF-OP:1{SMPL:1-Ax:Y1}Mtr.RBV",
     "XF:27IDF-OP:1{SMPL:1-Ax:Y2}Mtr.RBV",
     "XF:27IDF-OP:1{SMPL:1-Ax:Y3}Mtr.RBV"]
@@ -207,7 +239,7 @@ MCF4_MOTORS = [
 MCF5_MOTORS = [
     "XF:27IDF-OP:1{SMPL:1-Ax:Z2}Mtr.RBV",
     "XF:27IDF-OP:1{SMPL:1-Ax:X2}Mtr.RBV",
-    "XF:27IDF-OP:1{MC:5-Ax:4}Mtr.RBV",    
+    "XF:27IDF-OP:1{MC:5-Ax:4}Mtr.RBV",
     "XF:27IDF-OP:1{EDXD:1-Ax:X}Mtr.RBV",
     "XF:27IDF-OP:1{EDXD:1-Ax:Y}Mtr.RBV",
     "XF:27IDF-OP:1{EDXD:1-Ax:Z}Mtr.RBV",
@@ -240,7 +272,7 @@ MCF8_MOTORS = [
     "XF:27IDF-OP:1{OPT:1-Ax:ObjSel}Mtr.RBV",
     "XF:27IDF-OP:1{OPT:1-Ax:Focus2}Mtr.RBV",
     "XF:27IDF-OP:1{OPT:1-Ax:Focus1}Mtr.VAL",
-    "XF:27IDF-OP:1{OPT:2-Ax:Focus}Mtr.VAL",    
+    "XF:27IDF-OP:1{OPT:2-Ax:Focus}Mtr.VAL",
     "XF:27IDF-OP:1{OPT:2-Ax:CamRot}Mtr.VAL",
     "XF:27IDF-OP:1{SMPL:1-Ax:Ry1}Mtr.RBV"]
 
@@ -254,7 +286,10 @@ GERM_DETECTOR = {
 """
 
 
-mca1_motors = MotorValuesMCA1("XF:27IDA-OP:", name="mca1_motors", kind=Kind.normal)
+mca1_motors = lazy_devices.register(
+    "mca1_motors",
+    lambda: MotorValuesMCA1("XF:27IDA-OP:", name="mca1_motors", kind=Kind.normal),
+)
 
 
 class EDXD(Device):
@@ -266,54 +301,190 @@ class EDXD(Device):
     axis_rx = Cpt(EpicsMotorWithDescription, "Rx}Mtr")
 
 
-edxd = EDXD("XF:27IDF-OP:1{EDXD:1-Ax:", name="edxd")
+edxd = lazy_devices.register(
+    "edxd", lambda: EDXD("XF:27IDF-OP:1{EDXD:1-Ax:", name="edxd")
+)
 
-theta = edxd.axis_rx
+theta = LazyDevice(lambda: edxd.axis_rx, name="theta")
 
 # sd (SuppelementalData) is an attribute of RE, defined in the nslsii.__init__().
-sd.baseline += [getattr(mca1_motors, m) for m in mca1_motors.component_names]
+# The baseline entries are proxies too, so the MCA1 PVs are only connected by the first run.
+sd.baseline += [
+    LazyDevice(lambda m=m: getattr(mca1_motors, m), name=f"mca1_motors_{m}")
+    for m in MotorValuesMCA1.component_names
+]
 
 
-fe_shutter_status = EpicsSignalRO(
+fe_shutter_status = _EpicsSignalRO(
     "XF:27IDA-PPS{Sh:FE}Sts:OpnCmd-Sts", name="fe_shutter_status", string=False
 )
-# from nslsii.devices import TwoButtonShutter
 
 
-# class HEXTwoButtonShutter(TwoButtonShutter):
+class PhotonShutter(Device):
+    """
+    The HEX photon shutter: ``set("Open")``/``set("Close")`` put the command PV and
+    return a status that finishes once the position PV reports the new state.
+
+    nslsii's TwoButtonShutter did not work with this shutter, apparently because of
+    a minor EPS alarm of the status PV in the open position; here only the value of
+    the position PV is used, whatever its alarm severity, and the retries are driven
+    by a timer rather than by the command PV. A command is re-sent every
+    ``RETRY_PERIOD`` seconds, up to ``MAX_ATTEMPTS`` times, after which the status
+    fails with a TimeoutError. Nothing is sent if the shutter is already there.
+
+    Setting the target of the command in progress again returns its status. A
+    command to the other position supersedes it: the retries of the old command
+    stop and its status finishes (successfully, so that plans not waiting for it
+    are not aborted).
+    """
 
-#     RETRY_PERIOD = 2.0
-#     MAX_ATTEMPTS = 10
-    
-#     def stop(self, *, success=False):
-#         pass
+    RETRY_PERIOD = 3.0
+    MAX_ATTEMPTS = 3
 
+    status = Cpt(_EpicsSignalRO, "Pos-Sts", string=False)
+    open_cmd = Cpt(_EpicsSignal, "Cmd:Opn-Cmd", string=False)
+    close_cmd = Cpt(_EpicsSignal, "Cmd:Cls-Cmd", string=False)
 
-#ph_shutter = HEXTwoButtonShutter("XF:27IDA-PPS{L1-S1}", name="ph_shutter")
-ph_shutter_status = EpicsSignalRO(
-    "XF:27IDA-PPS{L1-S1}Pos-Sts", name="ph_shutter_status", string=False
-)
-ph_open_cmd = EpicsSignal(
-    "XF:27IDA-PPS{L1-S1}Cmd:Opn-Cmd", name="ph_shutter_open", string=False
-)
-ph_close_cmd = EpicsSignal(
-    "XF:27IDA-PPS{L1-S1}Cmd:Cls-Cmd", name="ph_shutter_close", string=False
-)
+    # Values of the position PV (enum strings)
+    open_val = "Open"
+    close_val = "Not Open"
+
+    # user facing commands
+    open_str = "Open"
+    close_str = "Close"
 
-# The two button shutter class does not seem to agree with HEX's photon shutter.
-# Potentially because of a minor EPS alarm state in the open position?
-# For now just actuating the signals and waiting for a few seconds seems to be more reliable.
-def open_ph_shutter():
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._set_st = None
+        self._set_target = None
+        self._set_lock = threading.Lock()
+
+    def _position(self, value):
+        enum_strs = self.status.enum_strs
+        if enum_strs and not isinstance(value, str):
+            return enum_strs[int(value)]
+        return value
+
+    def is_open(self):
+        return self._position(self.status.get()) == self.open_val
+
+    def set(self, value):
+        cmd_map = {self.open_str: self.open_cmd, self.close_str: self.close_cmd}
+        target_map = {self.open_str: self.open_val, self.close_str: self.close_val}
+        if value not in cmd_map:
+            raise ValueError(
+                f"{self.name} can only be set to {self.open_str!r} or {self.close_str!r}, not {value!r}"
+            )
+        cmd_sig = cmd_map[value]
+        target_val = target_map[value]
+
+        st = DeviceStatus(self)
+        with self._set_lock:
+            if self._set_st is not None and not self._set_st.done:
+                if self._set_target == target_val:
+                    return self._set_st
+                # A new command supersedes the one in progress (and stops its retries).
+                self._set_st.set_finished()
+            self._set_st = st
+            self._set_target = target_val
+
+        if self._position(self.status.get()) == target_val:
+            st.set_finished()
+            return st
+
+        def shutter_cb(value, **kwargs):
+            if self._position(value) == target_val:
+                with self._set_lock:
+                    if not st.done:
+                        st.set_finished()
+
+        attempts = 0
+
+        def actuate():
+            nonlocal attempts
+            with self._set_lock:
+                if st.done:
+                    return
+                attempts += 1
+                if attempts > self.MAX_ATTEMPTS:
+                    st.set_exception(
+                        TimeoutError(
+                            f"{self.name} is not {target_val!r} after {self.MAX_ATTEMPTS} attempts"
+                        )
+                    )
+                    return
+            if attempts > 1:
+                print(f"** Had to re-actuate {self.name} ({value}), attempt {attempts}")
+            try:
+                cmd_sig.put(1)
+            except Exception as err:
+                # e.g. a disconnected PV; raising in the timer thread would leave st pending
+                with self._set_lock:
+                    if not st.done:
+                        st.set_exception(err)
+                return
+            timer = threading.Timer(self.RETRY_PERIOD, actuate)
+            timer.daemon = True
+            timer.start()
+
+        self.status.subscribe(shutter_cb, run=False)
+        st.add_callback(lambda status: self.status.clear_sub(shutter_cb))
+        actuate()
+        # In case the shutter got there before the subscription:
+        shutter_cb(self.status.get())
+        return st
+
+
+ph_shutter = PhotonShutter("XF:27IDA-PPS{L1-S1}", name="ph_shutter")
+ph_shutter_status = ph_shutter.status
+ph_open_cmd = ph_shutter.open_cmd
+ph_close_cmd = ph_shutter.close_cmd
+
+# Typical time for the photon shutter to open or close.
+PH_SHUTTER_SETTLE_TIME = 3
+
+if HEX_SIMULATION:
+    fe_shutter_status.sim_put(1)
+
+    SIM_PH_SHUTTER_TIME = 0.5
+
+    def _sim_ph_shutter(position):
+        def move(value, **kwargs):
+            if value:
+                timer = threading.Timer(
+                    SIM_PH_SHUTTER_TIME, ph_shutter_status.sim_put, (position,)
+                )
+                timer.daemon = True
+                timer.start()
+
+        return move
+
+    ph_shutter_status.sim_set_enum_strs(
+        [PhotonShutter.open_val, PhotonShutter.close_val]
+    )
+    ph_shutter_status.sim_put(1)
+    ph_open_cmd.subscribe(_sim_ph_shutter(0), run=False)
+    ph_close_cmd.subscribe(_sim_ph_shutter(1), run=False)
+
+
+def open_ph_shutter(wait=True):
+    """Open the photon shutter; with ``wait=False`` wait later with bps.wait(group="ph_shutter_open")."""
     print("Opening photon shutter...")
-    yield from bps.abs_set(ph_open_cmd, 1)
-    yield from bps.sleep(3)
-    print("Done.")
+    yield from bps.abs_set(
+        ph_shutter, PhotonShutter.open_str, group="ph_shutter_open", wait=wait
+    )
+    if wait:
+        print("Done.")
+
 
-def close_ph_shutter():
+def close_ph_shutter(wait=True):
+    """Close the photon shutter; with ``wait=False`` wait later with bps.wait(group="ph_shutter_close")."""
     print("Closing photon shutter...")
-    yield from bps.abs_set(ph_close_cmd, 1)
-    yield from bps.sleep(3)
-    print("Done.")
+    yield from bps.abs_set(
+        ph_shutter, PhotonShutter.close_str, group="ph_shutter_close", wait=wait
+    )
+    if wait:
+        print("Done.")
 
 
 file_loading_timer.stop_timer(__file__)
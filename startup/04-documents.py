@@ -0,0 +1,749 @@
+file_loading_timer.start_timer(__file__)
+
+
+import fcntl
+import getpass
+import gzip
+import importlib.util
+import io
+import itertools
+
+import numpy as np
+
+zstandard = lazy_import("zstandard")
+msgpack = lazy_import("msgpack")
+httpx = lazy_import("httpx")
+
+HEX_DOCUMENT_EXPORT_DIR = Path(
+    HEX_SIM_DATA_DIR / "export-docs" if HEX_SIMULATION else "/tmp/export-docs"
+)
+# One spool per Unix user, the directories are not shared.
+HEX_DOCUMENT_SPOOL_DIR = Path(
+    os.environ.get(
+        "HEX_DOCUMENT_SPOOL_DIR",
+        (
+            HEX_SIM_DATA_DIR / "spool"
+            if HEX_SIMULATION
+            else f"/var/tmp/hex-document-spool-{getpass.getuser()}"
+        ),
+    )
+)
+
+
+def _encode_default(obj):
+    # numpy arrays/scalars -> lists/numbers, anything else -> str (as JSONWriter did)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+class DocumentExporter:
+    """
+    Export documents to one file per run, named ``scan_<scan_id>_<uid>.<format>[.zst|.gz]``.
+
+    Documents are encoded into an in-memory buffer which is written out (through
+    the compressor) when it grows past ``flush_bytes`` or when ``flush_interval``
+    seconds have passed since the last write, and always at the stop document.
+    This avoids one write syscall per ``stream_datum`` during long fly scans.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory the run files are written to.
+    compression : {"zstd", "gzip", None}
+        Falls back to gzip if the ``zstandard`` package is not installed.
+    format : {"jsonl", "msgpack"}
+        ``jsonl`` writes one ``[name, doc]`` JSON array per line.
+    """
+
+    EXTENSIONS = {"zstd": ".zst", "gzip": ".gz", None: ""}
+
+    def __init__(
+        self,
+        directory=HEX_DOCUMENT_EXPORT_DIR,
+        compression="zstd",
+        format="jsonl",
+        flush_bytes=1 << 20,
+        flush_interval=5.0,
+    ):
+        if format not in ("jsonl", "msgpack"):
+            raise ValueError(
+                f"Unsupported format {format!r}, use 'jsonl' or 'msgpack'."
+            )
+        if compression not in self.EXTENSIONS:
+            raise ValueError(
+                f"Unsupported compression {compression!r}, use 'zstd', 'gzip' or None."
+            )
+        if compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+            warnings.warn(
+                "zstandard is not installed, exporting documents with gzip instead."
+            )
+            compression = "gzip"
+        self.directory = Path(directory)
+        self.compression = compression
+        self.format = format
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.files = {}  # run uid -> path of the written files
+        self._runs = {}  # run uid -> open run state
+        self._owners = {}  # descriptor/resource/stream_resource uid -> run uid
+
+    def _encode(self, name, doc):
+        if self.format == "msgpack":
+            return msgpack.packb([name, doc], default=_encode_default)
+        return (
+            orjson.dumps(
+                [name, doc], default=_encode_default, option=orjson.OPT_SERIALIZE_NUMPY
+            )
+            + b"\n"
+        )
+
+    def _open(self, path):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().stream_writer(
+                open(path, "wb"), closefd=True
+            )
+        if self.compression == "gzip":
+            return gzip.open(path, "wb")
+        return open(path, "wb")
+
+    def _run_uid(self, name, doc):
+        if name == "start":
+            return doc["uid"]
+        if name in ("descriptor", "resource", "stream_resource", "stop"):
+            run_uid = doc.get("run_start")
+        elif name in ("event", "event_page"):
+            run_uid = self._owners.get(doc["descriptor"])
+        elif name == "datum":
+            run_uid = self._owners.get(doc["datum_id"].split("/")[0])
+        elif name == "datum_page":
+            run_uid = self._owners.get(doc["resource"])
+        elif name == "stream_datum":
+            run_uid = self._owners.get(doc["stream_resource"])
+        else:
+            run_uid = None
+        if run_uid is None and len(self._runs) == 1:
+            # e.g. resources without 'run_start'; there is only one place they can go
+            run_uid = next(iter(self._runs))
+        return run_uid
+
+    def __call__(self, name, doc):
+        if name == "start":
+            self.directory.mkdir(parents=True, exist_ok=True)
+            filename = (
+                f"scan_{str(doc.get('scan_id', 0)).zfill(5)}_{doc['uid']}.{self.format}"
+            )
+            path = self.directory / (filename + self.EXTENSIONS[self.compression])
+            self.files[doc["uid"]] = path
+            self._runs[doc["uid"]] = {
+                "file": self._open(path),
+                "buffer": [],
+                "size": 0,
+                "last_flush": ttime.monotonic(),
+            }
+
+        run_uid = self._run_uid(name, doc)
+        run = self._runs.get(run_uid)
+        if run is None:
+            return  # document of a run started before this exporter was subscribed
+
+        if name in ("descriptor", "resource", "stream_resource"):
+            self._owners[doc["uid"]] = run_uid
+
+        data = self._encode(name, doc)
+        run["buffer"].append(data)
+        run["size"] += len(data)
+        if (
+            name == "stop"
+            or run["size"] >= self.flush_bytes
+            or ttime.monotonic() - run["last_flush"] >= self.flush_interval
+        ):
+            self._flush(run)
+
+        if name == "stop":
+            self._close(run_uid)
+
+    def _flush(self, run):
+        if run["buffer"]:
+            run["file"].write(b"".join(run["buffer"]))
+            run["buffer"].clear()
+            run["size"] = 0
+        run["last_flush"] = ttime.monotonic()
+
+    def _close(self, run_uid):
+        run = self._runs.pop(run_uid)
+        self._flush(run)
+        run["file"].close()
+        self._owners = {
+            uid: owner for uid, owner in self._owners.items() if owner != run_uid
+        }
+
+    def close(self):
+        """Flush and close the files of runs that have not received a stop document."""
+        for run_uid in list(self._runs):
+            self._close(run_uid)
+
+
+def read_documents(path):
+    """
+    Lazily read back a file written by DocumentExporter.
+
+    Yields ``(name, doc)`` pairs one at a time, so large fly scans can be
+    replayed without loading the whole file.
+    """
+    path = Path(path)
+    suffixes = path.suffixes
+    if suffixes and suffixes[-1] == ".zst":
+        reader = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        )
+        suffixes = suffixes[:-1]
+    elif suffixes and suffixes[-1] == ".gz":
+        reader = gzip.open(path, "rb")
+        suffixes = suffixes[:-1]
+    else:
+        reader = open(path, "rb")
+
+    with reader:
+        if suffixes and suffixes[-1] == ".msgpack":
+            for name, doc in msgpack.Unpacker(reader, raw=False):
+                yield name, doc
+        else:
+            for line in reader:
+                if line.strip():
+                    name, doc = orjson.loads(line)
+                    yield name, doc
+
+
+def _continues_stream_datum(doc, next_doc):
+    return (
+        next_doc["stream_resource"] == doc["stream_resource"]
+        and next_doc["descriptor"] == doc["descriptor"]
+        and next_doc["indices"]["start"] == doc["indices"]["stop"]
+        and next_doc["seq_nums"]["start"] == doc["seq_nums"]["stop"]
+    )
+
+
+def _merge_stream_datum(doc, next_doc):
+    """One stream_datum covering ``doc`` and the ``next_doc`` that continues it."""
+    return dict(
+        doc,
+        indices={"start": doc["indices"]["start"], "stop": next_doc["indices"]["stop"]},
+        seq_nums={
+            "start": doc["seq_nums"]["start"],
+            "stop": next_doc["seq_nums"]["stop"],
+        },
+    )
+
+
+def _document_key(name, doc):
+    """The uid identifying a document (pages are identified by their first uid)."""
+    if name == "event_page":
+        return f"event_page/{doc['uid'][0]}"
+    if name == "datum_page":
+        return f"datum_page/{doc['datum_id'][0]}"
+    return doc.get("uid") or doc.get("datum_id")
+
+
+# msgpack extension types used by the spool, so that numpy values come back as such
+_SPOOL_NDARRAY = 1
+_SPOOL_NUMPY_SCALAR = 2
+
+
+def _spool_default(obj):
+    if isinstance(obj, (np.ndarray, np.generic)) and not obj.dtype.hasobject:
+        descr = np.lib.format.dtype_to_descr(obj.dtype)
+        if isinstance(obj, np.generic):
+            return msgpack.ExtType(
+                _SPOOL_NUMPY_SCALAR, msgpack.packb([descr, obj.tobytes()])
+            )
+        return msgpack.ExtType(
+            _SPOOL_NDARRAY,
+            msgpack.packb([descr, obj.shape, np.ascontiguousarray(obj).tobytes()]),
+        )
+    raise TypeError(
+        f"Cannot spool a value of type {type(obj).__name__} ({obj!r}); documents "
+        "may only contain JSON types and numpy arrays or scalars."
+    )
+
+
+def _spool_ext_hook(code, data):
+    if code in (_SPOOL_NDARRAY, _SPOOL_NUMPY_SCALAR):
+        descr, *shape, buffer = msgpack.unpackb(data, raw=False)
+        array = np.frombuffer(buffer, dtype=np.lib.format.descr_to_dtype(descr))
+        if code == _SPOOL_NUMPY_SCALAR:
+            return array[0]
+        return array.reshape(shape[0]).copy()
+    return msgpack.ExtType(code, data)
+
+
+def _spool_unpacker(f):
+    return msgpack.Unpacker(
+        f, raw=False, strict_map_key=False, ext_hook=_spool_ext_hook
+    )
+
+
+class DocumentSpool:
+    """
+    Append-only, on-disk log of every document, read by SpoolUploader threads.
+
+    The RunEngine only waits for a local file append, so scans run at full speed
+    while Tiled or Kafka are slow or down; the uploaders catch up afterwards.
+    Documents are stored as msgpack records, ``[name, doc, time written]``, in
+    ``segment-<index>.msgpack`` files; numpy arrays and scalars are kept as such
+    and a value that cannot be stored raises TypeError.
+    A new segment is started at every session and when the current one exceeds
+    ``segment_bytes``; segments read by every uploader are deleted.
+
+    Records are buffered and written out when ``flush_bytes`` have accumulated or
+    ``flush_interval`` seconds have passed since the last write, and always (and
+    synced to disk) at the stop document, like DocumentExporter. A crash of the
+    process loses at most the documents buffered since the last write.
+
+    Each process spools into its own subdirectory of ``root`` (``0``, ``1``, ...),
+    held with an exclusive lock for the lifetime of the process. A new session
+    takes the first unlocked one, so it resumes the backlog left by a session
+    that exited or crashed, and two sessions never share segments or offsets.
+    """
+
+    def __init__(
+        self,
+        root,
+        segment_bytes=64 * 1024**2,
+        flush_bytes=1 << 20,
+        flush_interval=1.0,
+    ):
+        self.root = Path(root)
+        self.directory, self._lock_file = self._claim_directory(self.root)
+        self.segment_bytes = segment_bytes
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.uploaders = {}
+        self.written = 0  # documents written by this process
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = ttime.monotonic()
+        indices = self.segment_indices()
+        self.current_index = indices[-1] + 1 if indices else 0
+        self._file = open(self.segment_path(self.current_index), "ab", buffering=0)
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _claim_directory(root):
+        for number in itertools.count():
+            directory = root / str(number)
+            directory.mkdir(parents=True, exist_ok=True)
+            lock_file = open(directory / "lock", "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()  # in use by another session
+                continue
+            return directory, lock_file
+
+    def segment_path(self, index):
+        return self.directory / f"segment-{index:08d}.msgpack"
+
+    def segment_indices(self):
+        return sorted(
+            int(path.stem.split("-")[1])
+            for path in self.directory.glob("segment-*.msgpack")
+        )
+
+    def __call__(self, name, doc):
+        record = msgpack.packb([name, doc, ttime.time()], default=_spool_default)
+        with self._lock:
+            self.written += 1
+            self._buffer.append(record)
+            self._buffered += len(record)
+            if (
+                name == "stop"
+                or self._buffered >= self.flush_bytes
+                or ttime.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush()
+                if name == "stop":
+                    os.fsync(self._file.fileno())  # survives a crash of the machine
+                if self._file.tell() >= self.segment_bytes:
+                    self._rotate()
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self._last_flush = ttime.monotonic()
+
+    def flush(self):
+        """Write out the buffered documents, so that the uploaders see them."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Stop the uploaders and release the spool directory; the backlog is kept."""
+        for uploader in self.uploaders.values():
+            uploader.stop()
+        with self._lock:
+            self._flush()
+            self._file.close()
+        atexit.unregister(self.flush)
+        self._lock_file.close()  # releases the directory for another session
+
+    def _rotate(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.current_index += 1
+        self._file = open(self.segment_path(self.current_index), "ab", buffering=0)
+
+    def add_uploader(self, name, callback, **kwargs):
+        uploader = self.uploaders[name] = SpoolUploader(self, name, callback, **kwargs)
+        return uploader
+
+    def collect_garbage(self):
+        """Delete the segments every uploader has moved past."""
+        if not self.uploaders:
+            return
+        done = min(uploader.segment for uploader in self.uploaders.values())
+        for index in self.segment_indices():
+            if index < done and index < self.current_index:
+                self.segment_path(index).unlink(missing_ok=True)
+
+    def status(self):
+        """Print how far behind each uploader is, and its statistics per run."""
+        self.flush()
+        segments = self.segment_indices()
+        print(
+            f"Document spool {self.directory}: {len(segments)} segment(s), writing {self.current_index}"
+        )
+        for uploader in self.uploaders.values():
+            backlog_docs, backlog_bytes = uploader.backlog()
+            state = (
+                f"retrying after: {uploader.last_error!r}"
+                if uploader.last_error
+                else "ok"
+            )
+            print(
+                f"    {uploader.name:10}: {uploader.delivered} delivered, {uploader.duplicates} duplicate(s) "
+                f"skipped, {uploader.rejected} rejected, backlog {backlog_docs} document(s) / {backlog_bytes / 1024**2:.1f} MiB, {state}"
+            )
+            uploader.report()
+
+    def drain(self, timeout=None):
+        """Wait until every uploader has delivered the whole backlog; True if it did."""
+        self.flush()
+        deadline = None if timeout is None else ttime.monotonic() + timeout
+        while not all(uploader.caught_up() for uploader in self.uploaders.values()):
+            if deadline is not None and ttime.monotonic() > deadline:
+                self.status()
+                return False
+            ttime.sleep(0.1)
+        return True
+
+
+def _is_transient(err):
+    """Whether an uploader error is worth retrying until the service is back."""
+    if isinstance(err, (OSError, BufferError)):
+        return True  # connection refused or reset, timeouts, a full producer queue
+    if type(err).__module__.startswith("httpx"):
+        if isinstance(err, httpx.HTTPStatusError):
+            return err.response.status_code >= 500
+        return isinstance(err, httpx.TransportError)
+    kafka_error = err.args[0] if err.args else None
+    if hasattr(kafka_error, "retriable"):
+        return kafka_error.retriable()  # confluent_kafka.KafkaException
+    return False
+
+
+class SpoolUploader:
+    """
+    Deliver the documents of a DocumentSpool to ``callback`` from a worker thread.
+
+    The position reached is committed to ``<name>.offset`` and the key of every
+    document delivered since the last commit is journaled in ``<name>.delivered``,
+    so after a restart delivery resumes where it stopped (at-least-once) and
+    documents already delivered are skipped by uid. If the callback raises, the
+    same document is retried with an exponential backoff up to ``max_backoff``:
+    indefinitely for connection errors and server (5xx) errors, ``max_attempts``
+    times for any other error. A document that still fails is appended to
+    ``<name>.rejected.jsonl`` together with the error, and the uploader moves on;
+    the following documents of that run (typically refused as well, e.g. after a
+    crash a fresh TiledWriter gets descriptors of a run it never saw start) are
+    tried only once. With ``merge_stream_datum``, consecutive stream_datum
+    documents that continue each other are delivered as one (for Tiled, which
+    stores them as ranges anyway); otherwise every document is delivered as
+    spooled.
+
+    ``runs`` keeps per-run statistics of this session: documents delivered, the
+    largest backlog (documents spooled but not delivered yet) and the largest and
+    final lag between spooling and delivering a document, see report().
+    """
+
+    def __init__(
+        self,
+        spool,
+        name,
+        callback,
+        batch_size=1000,
+        max_backoff=30.0,
+        max_attempts=5,
+        merge_stream_datum=False,
+    ):
+        self.spool = spool
+        self.name = name
+        self.callback = callback
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.merge_stream_datum = merge_stream_datum
+        self.delivered = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.last_error = None
+        self._rejecting_run = False  # a document of the current run was rejected
+        self._offset_path = spool.directory / f"{name}.offset"
+        self._journal_path = spool.directory / f"{name}.delivered"
+        self._rejected_path = spool.directory / f"{name}.rejected.jsonl"
+        self.segment, self.offset = 0, 0
+        if self._offset_path.exists():
+            state = json.loads(self._offset_path.read_text())
+            self.segment, self.offset = state["segment"], state["offset"]
+        else:
+            indices = spool.segment_indices()
+            self.segment = indices[0] if indices else spool.current_index
+        self._seen = set()
+        if self._journal_path.exists():
+            self._seen.update(self._journal_path.read_text().split())
+        self._journal = open(self._journal_path, "a")
+        self.runs = {}  # run uid -> delivery statistics
+        self._current_run = None
+        # so that spool.written - _consumed is the backlog
+        self._consumed = -self.backlog()[0]
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"{name}-uploader", daemon=True
+        )
+        self._thread.start()
+
+    def _read_batch(self):
+        """Complete records from the current position (and the byte offset after each)."""
+        path = self.spool.segment_path(self.segment)
+        # checked before reading the last records
+        finished = self.segment < self.spool.current_index
+        records = []
+        if path.exists():
+            with open(path, "rb") as f:
+                f.seek(self.offset)
+                # stops at the end, or at a record still being written
+                unpacker = _spool_unpacker(f)
+                for record in itertools.islice(unpacker, self.batch_size):
+                    records.append((record, self.offset + unpacker.tell()))
+        if not records and finished:
+            # Segment finished (a record cut short by a crash is dropped): go to the next one.
+            self._commit(self.segment + 1, 0)
+            self.spool.collect_garbage()
+        return records
+
+    def _commit(self, segment, offset):
+        tmp_path = self._offset_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"segment": segment, "offset": offset}))
+        os.replace(tmp_path, self._offset_path)
+        self.segment, self.offset = segment, offset
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        if len(self._seen) > 100000:
+            self._seen.clear()  # the journal only has to cover the uncommitted documents
+
+    def _deliver(self, name, doc, keys, written):
+        """Deliver (or reject) one document; False if stopped while retrying it."""
+        if name == "start":
+            self._rejecting_run = False
+        backoff = 0.5
+        attempts = 0
+        while True:
+            try:
+                self.callback(name, doc)
+            except Exception as err:
+                attempts += 1
+                if not _is_transient(err) and (
+                    self._rejecting_run or attempts >= self.max_attempts
+                ):
+                    self._reject(name, doc, err)
+                    self._handled(keys)
+                    return True
+                if self.last_error is None:
+                    print(
+                        f"{self.name} uploader: {err!r}; documents are kept in the spool and retried."
+                    )
+                self.last_error = err
+                if self._stopping.wait(backoff):
+                    return False
+                backoff = min(2 * backoff, self.max_backoff)
+            else:
+                if self.last_error is not None:
+                    print(f"{self.name} uploader: delivering again.")
+                self.last_error = None
+                break
+        self._handled(keys)
+        self.delivered += len(keys)
+        self._record(name, doc, len(keys), written)
+        return True
+
+    def _handled(self, keys):
+        self._journal.write("".join(f"{key}\n" for key in keys))
+        self._journal.flush()
+        self._seen.update(keys)
+
+    def _reject(self, name, doc, err):
+        if not self._rejecting_run:
+            print(
+                f"{self.name} uploader: {name} document refused ({err!r}), moved to "
+                f"{self._rejected_path}; the rest of its run is tried once."
+            )
+        self._rejecting_run = True
+        self.last_error = None
+        self.rejected += 1
+        with open(self._rejected_path, "ab") as f:
+            f.write(
+                orjson.dumps(
+                    [name, doc, repr(err)],
+                    default=_encode_default,
+                    option=orjson.OPT_SERIALIZE_NUMPY,
+                )
+                + b"\n"
+            )
+
+    def _record(self, name, doc, count, written):
+        if name == "start":
+            self._current_run = doc["uid"]
+            self.runs[doc["uid"]] = {
+                "scan_id": doc.get("scan_id"),
+                "delivered": 0,
+                "max_backlog": 0,
+                "max_lag": 0.0,
+            }
+        stats = self.runs.get(self._current_run)
+        if stats is None:
+            return
+        lag = ttime.time() - written
+        stats["delivered"] += count
+        stats["max_backlog"] = max(
+            stats["max_backlog"], self.spool.written - self._consumed
+        )
+        stats["max_lag"] = max(stats["max_lag"], lag)
+        if name == "stop":
+            stats["lag at stop"] = lag
+
+    def report(self):
+        """Print the delivery statistics of the runs of this session."""
+        for run_uid, stats in self.runs.items():
+            lag_at_stop = stats.get("lag at stop")
+            print(
+                f"    scan {stats['scan_id']} ({run_uid[:8]}): {stats['delivered']} delivered, "
+                f"max backlog {stats['max_backlog']}, max lag {stats['max_lag']:.3f} s"
+                + ("" if lag_at_stop is None else f", lag at stop {lag_at_stop:.3f} s")
+            )
+
+    def _run(self):
+        while not self._stopping.is_set():
+            records = self._read_batch()
+            if not records:
+                self._stopping.wait(0.1)
+                continue
+            documents = []
+            for (name, doc, written), _ in records:
+                self._consumed += 1
+                key = _document_key(name, doc)
+                if key in self._seen:
+                    self.duplicates += 1
+                elif (
+                    self.merge_stream_datum
+                    and name == "stream_datum"
+                    and documents
+                    and documents[-1][0] == "stream_datum"
+                    and _continues_stream_datum(documents[-1][1], doc)
+                ):
+                    documents[-1] = (
+                        name,
+                        _merge_stream_datum(documents[-1][1], doc),
+                        documents[-1][2] + [key],
+                        documents[-1][3],
+                    )
+                else:
+                    documents.append((name, doc, [key], written))
+            for name, doc, keys, written in documents:
+                if not self._deliver(name, doc, keys, written):
+                    return  # resumes from the last commit, skipping what was journaled
+            self._commit(self.segment, records[-1][1])
+
+    def stop(self):
+        """Stop the worker thread after the document being delivered."""
+        self._stopping.set()
+        self._thread.join()
+        self._journal.close()
+
+    def caught_up(self):
+        current = self.spool.segment_path(self.spool.current_index)
+        return (
+            self.segment == self.spool.current_index
+            and self.offset >= current.stat().st_size
+        )
+
+    def backlog(self):
+        """Number of documents and bytes not delivered yet."""
+        documents = size = 0
+        for index in self.spool.segment_indices():
+            if index < self.segment:
+                continue
+            path = self.spool.segment_path(index)
+            offset = self.offset if index == self.segment else 0
+            with open(path, "rb") as f:
+                f.seek(offset)
+                unpacker = _spool_unpacker(f)
+                while True:
+                    try:
+                        unpacker.skip()
+                    except msgpack.OutOfData:
+                        break
+                    documents += 1
+            size += max(path.stat().st_size - offset, 0)
+        return documents, size
+
+
+class _SubscriptionCapture:
+    """Stands in for the RunEngine to capture what a configure_* helper subscribes."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def subscribe(self, func, name="all"):
+        self.callbacks.append(func)
+        return len(self.callbacks)
+
+
+# Not subscribed by default; use RE.subscribe(jlw) to export the documents of the next runs.
+jlw = DocumentExporter()
+
+# Every document goes to the local spool first; Tiled (and Kafka) are fed from it
+# by uploader threads. Use document_spool.status() / document_spool.drain() to
+# inspect or wait for the backlog; refused documents end up in
+# <spool directory>/<uploader>.rejected.jsonl.
+document_spool = DocumentSpool(HEX_DOCUMENT_SPOOL_DIR)
+RE.subscribe(document_spool)
+document_spool.add_uploader(
+    "tiled",
+    callback_profiler.wrap(tw, "tiled uploader", per_run=False),
+    merge_stream_datum=True,
+)
+
+if not HEX_SIMULATION:
+    _kafka_subscriptions = _SubscriptionCapture()
+    configure_kafka_publisher(_kafka_subscriptions, beamline_name="hex")
+    (kafka_publisher,) = _kafka_subscriptions.callbacks
+    document_spool.add_uploader(
+        "kafka",
+        callback_profiler.wrap(kafka_publisher, "kafka uploader", per_run=False),
+    )
+
+
+file_loading_timer.stop_timer(__file__)
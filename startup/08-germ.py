@@ -7,26 +7,34 @@ from collections import deque
 from enum import Enum
 from pathlib import Path
 
-import h5py
 import numpy as np
 from event_model import compose_resource
-from hextools.germ.ophyd import HEXGeRMDetectorHDF5
 from ophyd import Component as Cpt
 from ophyd import Device, EpicsSignal, Kind, Signal
 from ophyd.sim import new_uid
 from ophyd.status import SubscriptionStatus
-from PIL import Image
 
+h5py = lazy_import("h5py")
+Image = lazy_import("PIL.Image")
+HEXGeRMDetectorHDF5 = lazy_import("hextools.germ.ophyd", "HEXGeRMDetectorHDF5")
 
-# Intialize the GeRM detector ophyd object
-germ_detector = HEXGeRMDetectorHDF5(
-    "XF:27ID1-ES{GeRM-Det:1}",
-    name="germ",
-    root_dir="/nsls2/data/hex/proposals",
-    md=RE.md,
-    date_template="%Y"
-)
 
-germ_detector.frame_shape.kind = Kind.omitted
+def make_germ_detector():
+    if HEX_SIMULATION:
+        return SimGeRMDetector("XF:27ID1-ES{GeRM-Det:1}", name="germ")
+
+    # Intialize the GeRM detector ophyd object
+    germ = HEXGeRMDetectorHDF5(
+        "XF:27ID1-ES{GeRM-Det:1}",
+        name="germ",
+        root_dir=HEX_PROPOSAL_DIR_ROOT,
+        md=RE.md,
+        date_template="%Y",
+    )
+    germ.frame_shape.kind = Kind.omitted
+    return germ
+
+
+germ_detector = lazy_devices.register("germ_detector", make_germ_detector)
 
 file_loading_timer.stop_timer(__file__)
@@ -19,16 +19,16 @@ from ophyd import Component as Cpt
 from ophyd import Device, EpicsMotor, EpicsPathSignal, EpicsSignal, EpicsSignalWithRBV
 from ophyd_async.core import (
     DEFAULT_TIMEOUT,
+    AsyncStatus,
     DetectorControl,
     DetectorTrigger,
     DetectorWriter,
+    DeviceCollector,
     SignalRW,
+    StandardDetector,
     TriggerInfo,
     TriggerLogic,
 )
-from ophyd_async.core import AsyncStatus
-from ophyd_async.core import StandardDetector
-from ophyd_async.core import DeviceCollector
 from ophyd_async.fastcs.panda import HDFPanda
 
 # class HEXPandaHDFWriter(PandaHDFWriter):
@@ -48,22 +48,20 @@ panda_flyer = StandardFlyer(panda_trigger_logic, [], name="panda_flyer")
 
 
 def connect_to_panda(panda_id):
-
-    print(f"Connecting to Panda {panda_id}...")
-    with DeviceCollector():
-        panda_path_provider = ProposalNumYMDPathProvider(default_filename_provider)
-        panda = HDFPanda(
-            f"XF:27ID1-ES{{PANDA:{panda_id}}}:",
-            panda_path_provider,
-            name=f"panda{panda_id}",
-        )
-
-    print("Done.")
+    """Build an (unconnected) PandA, connection happens in the startup connection stage."""
+    panda_path_provider = ProposalNumYMDPathProvider(default_filename_provider)
+    panda = HDFPanda(
+        f"XF:27ID1-ES{{PANDA:{panda_id}}}:",
+        panda_path_provider,
+        name=f"panda{panda_id}",
+    )
 
     return panda
 
 
-panda1 = connect_to_panda(1)
+async_device_registry.register(
+    "panda1", lambda: connect_to_panda(1), simulation=simulate_panda
+)
 
 
 def panda_fly(panda, num=724):
@@ -81,28 +79,7 @@ def panda_fly(panda, num=724):
     yield from bps.kickoff(panda_flyer)
     yield from bps.kickoff(detector)
 
-    yield from bps.complete(panda_flyer, wait=True, group="complete")
-    yield from bps.complete(detector, wait=True, group="complete")
-
-    # Manually incremenet the index as if a frame was taken
-    # detector.writer.index += 1
-
-    done = False
-    while not done:
-        try:
-            yield from bps.wait(group="complete", timeout=0.5)
-        except TimeoutError:
-            pass
-        else:
-            done = True
-        yield from bps.collect(
-            panda,
-            # stream=False,
-            # return_payload=False,
-            name="main_stream",
-        )
-        yield from bps.sleep(0.01)
-    yield from bps.wait(group="complete")
+    yield from collect_while_completing([panda_flyer], [detector], "main_stream")
     val = yield from bps.rd(panda.data.num_captured)
     print(f"{val = }")
     yield from bps.close_run()
@@ -19,11 +19,11 @@ from ophyd_async.core import (
     TriggerInfo,
     TriggerLogic,
 )
-from ophyd_async.core import DeviceCollector
 from ophyd_async.epics.adkinetix import KinetixDetector
 
 kinetix_trigger_logic = StandardTriggerLogic()
 
+
 class HEXKinetixDetector(KinetixDetector):
     """Override base StandardDetector unstage class to reset into continuous mode after scan/abort"""
 
@@ -39,32 +39,30 @@ class HEXKinetixDetector(KinetixDetector):
 
 
 def connect_to_kinetix(kinetix_id):
-
-    print(f"Connecting to kinetix {kinetix_id}...")
-    with DeviceCollector():
-        kinetix_path_provider = ProposalNumYMDPathProvider(default_filename_provider)
-        kinetix = HEXKinetixDetector(
-            f"XF:27ID1-BI{{Kinetix-Det:{kinetix_id}}}",
-            kinetix_path_provider,
-            name=f"kinetix-det{kinetix_id}",
-        )
-
-    print("Done.")
+    """Build an (unconnected) Kinetix, connection happens in the startup connection stage."""
+    kinetix_path_provider = ProposalNumYMDPathProvider(default_filename_provider)
+    kinetix = HEXKinetixDetector(
+        f"XF:27ID1-BI{{Kinetix-Det:{kinetix_id}}}",
+        kinetix_path_provider,
+        name=f"kinetix-det{kinetix_id}",
+    )
 
     return kinetix
 
-try:
-    kinetix1 = connect_to_kinetix(1)
-except Exception as e:
-    print(f"Kinetix 1 is unavailable...")
 
-try:
-    kinetix3 = connect_to_kinetix(3)
-except Exception as e:
-    print(f"Kinetix 3 is unavailable...")
+async_device_registry.register(
+    "kinetix1", lambda: connect_to_kinetix(1), simulation=simulate_kinetix
+)
+async_device_registry.register(
+    "kinetix3", lambda: connect_to_kinetix(3), simulation=simulate_kinetix
+)
+
+# Connect the PandA(s) and Kinetix detectors all at once. Unavailable devices are
+# reported and left undefined; retry them later with ``connect_async_devices(["kinetix3"])``.
+connect_async_devices()
 
-#sd.baseline.append(kinetix1.drv.acquire_time)
-#RE.preprocessors.append(sd)
+# sd.baseline.append(kinetix1.drv.acquire_time)
+# RE.preprocessors.append(sd)
 
 
 # TODO: add as a new component into ophyd-async.
@@ -75,9 +73,7 @@ except Exception as e:
 # )
 
 
-kinetix_flyer = StandardFlyer(
-    kinetix_trigger_logic, [], name="kinetix_flyer"
-)
+kinetix_flyer = StandardFlyer(kinetix_trigger_logic, [], name="kinetix_flyer")
 
 
 def kinetix_stage(kinetix_detector):
@@ -85,40 +81,26 @@ def kinetix_stage(kinetix_detector):
     yield from bps.sleep(5)
 
 
-def inner_kinetix_collect(kinetix_detector):
+def inner_kinetix_collect(*kinetix_detectors):
+    """Acquire with all (prepared) ``kinetix_detectors`` at once, one stream per detector."""
 
     yield from bps.kickoff(kinetix_flyer)
-    yield from bps.kickoff(kinetix_detector)
-
-    yield from bps.complete(kinetix_flyer, wait=True, group="complete")
-    yield from bps.complete(kinetix_detector, wait=True, group="complete")
-
-    # Manually incremenet the index as if a frame was taken
-    # detector.writer.index += 1
-
-    done = False
-    while not done:
-        try:
-            yield from bps.wait(group="complete", timeout=0.5)
-        except TimeoutError:
-            pass
-        else:
-            done = True
-
-        detector_stream_name = f"{kinetix_detector.name}_{kinetix_detector._writer._path_provider._filename_provider._frame_type.value}_stream"
-        yield from bps.declare_stream(kinetix_detector, name=detector_stream_name)
-
-        yield from bps.collect(
-            kinetix_detector,
-            # stream=True,
-            # return_payload=False,
-            name=detector_stream_name,
+    for kinetix_detector in kinetix_detectors:
+        yield from bps.kickoff(kinetix_detector)
+
+    def detector_stream_name(kinetix_detector):
+        frame_type = (
+            kinetix_detector._writer._path_provider._filename_provider._frame_type.value
         )
-        yield from bps.sleep(0.01)
+        return f"{kinetix_detector.name}_{frame_type}_stream"
 
-    yield from bps.wait(group="complete")
-    val = yield from bps.rd(kinetix_detector._writer.hdf.num_captured)
-    print(f"{val = }")
+    yield from collect_while_completing(
+        [kinetix_flyer], kinetix_detectors, detector_stream_name
+    )
+
+    for kinetix_detector in kinetix_detectors:
+        val = yield from bps.rd(kinetix_detector._writer.hdf.num_captured)
+        print(f"{kinetix_detector.name}: {val = }")
 
 
 def kinetix_collect(kinetix_detector, num=10, exposure_time=0.1, software_trigger=True):
@@ -132,7 +114,11 @@ def kinetix_collect(kinetix_detector, num=10, exposure_time=0.1, software_trigge
     yield from bps.stage_all(kinetix_detector, kinetix_flyer)
 
     yield from bps.prepare(kinetix_flyer, kinetix_exp_setup, wait=True)
-    yield from bps.prepare(kinetix_detector, kinetix_flyer.trigger_logic.trigger_info(kinetix_exp_setup), wait=True)
+    yield from bps.prepare(
+        kinetix_detector,
+        kinetix_flyer.trigger_logic.trigger_info(kinetix_exp_setup),
+        wait=True,
+    )
 
     yield from inner_kinetix_collect(kinetix_detector)
 
@@ -154,7 +140,11 @@ def _kinetix_collect_dark_flat(
     yield from bps.stage_all(kinetix_detector, kinetix_flyer)
 
     yield from bps.prepare(kinetix_flyer, kinetix_exp_setup, wait=True)
-    yield from bps.prepare(kinetix_detector, kinetix_flyer.trigger_logic.trigger_info(kinetix_exp_setup), wait=True)
+    yield from bps.prepare(
+        kinetix_detector,
+        kinetix_flyer.trigger_logic.trigger_info(kinetix_exp_setup),
+        wait=True,
+    )
 
     yield from inner_kinetix_collect(kinetix_detector)
 
@@ -164,13 +154,9 @@ def _kinetix_collect_dark_flat(
 
 
 def kinetix_fly(
-    detectors=None,
-    exposure_time=0.05,
-    flyer=None,
-    num=10,
-    stream_name="proj"
+    detectors=None, exposure_time=0.05, flyer=None, num=10, stream_name="proj"
 ):  # Note: 724 points are specific for the "rotation_sim_04" panda config!
-    
+
     if detectors is None:
         detectors = [kinetix1]
     if flyer is None:
@@ -183,7 +169,9 @@ def kinetix_fly(
     yield from bps.stage_all(*detectors, flyer)
     yield from bps.prepare(flyer, num, wait=True)
     for detector in detectors:
-        yield from bps.prepare(detector, flyer.trigger_logic.trigger_info(kinetix_exp_setup), wait=True)
+        yield from bps.prepare(
+            detector, flyer.trigger_logic.trigger_info(kinetix_exp_setup), wait=True
+        )
 
     # detector.controller.disarm.assert_called_once  # type: ignore
 
@@ -193,35 +181,14 @@ def kinetix_fly(
     for detector in detectors:
         yield from bps.kickoff(detector)
 
-    for detector in detectors:
-        yield from bps.complete(detector, wait=True, group="complete")
-
-    # Manually incremenet the index as if a frame was taken
-    # detector.writer.index += 1
+    yield from collect_while_completing(
+        [], detectors, lambda detector: f"{detector.name}_{stream_name}"
+    )
 
-    for detector in detectors:
-        yield from bps.declare_stream(detector, name=f"{detector.name}_{stream_name}")
-
-    done = False
-    while not done:
-        try:
-            yield from bps.wait(group="complete", timeout=0.5)
-        except TimeoutError:
-            pass
-        else:
-            done = True
-        for detector in detectors:
-            yield from bps.collect(
-                detector,
-                name=f"{detector.name}_{stream_name}",
-            )
-        yield from bps.sleep(0.01)
-
-    yield from bps.wait(group="complete")
     for detector in detectors:
         val = yield from bps.rd(detector.hdf.num_captured)
         print(f"{detector.name}: {val}")
-    
+
     yield from bps.close_run()
 
     yield from bps.unstage_all(flyer, *detectors)
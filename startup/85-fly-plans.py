@@ -6,6 +6,13 @@ DEG_PER_REVOLUTION = 360
 COUNTS_PER_DEG = COUNTS_PER_REVOLUTION / DEG_PER_REVOLUTION
 ZERO_OFFSET = 39660
 
+import collections
+import functools
+import json
+import sys
+from dataclasses import dataclass
+
+from ophyd_async.core import wait_for_value
 from ophyd_async.epics.adkinetix._kinetix_io import KinetixReadoutMode
 
 DETECTOR_MAX_FRAMERATES = {
@@ -18,6 +25,214 @@ DETECTOR_MAX_FRAMERATES = {
 TOMO_ROTARY_STAGE_VELO_RESET_MAX = 30
 TOMO_ROTARY_STAGE_VELO_SCAN_MAX = 60
 
+# Minimum time between the end of an exposure and the next trigger, in seconds.
+TOMO_FLYSCAN_OVERHEAD = 0.005
+
+
+@dataclass
+class FlyscanTiming:
+    """A consistent set of flyscan parameters, see solve_flyscan_timing."""
+
+    exposure_time: float
+    num_images: int
+    start_deg: float
+    stop_deg: float
+    lead_angle: float
+    step_time: float  # time between triggers (the PandA pulse step), in s
+    pulse_width: float  # in s
+    step_counts: float  # encoder counts between projections
+    rot_motor_vel: float  # in deg/s
+    reset_speed: float  # in deg/s
+    framerate: float  # in Hz
+    limited_by: str  # what sets step_time: "exposure", "framerate" or "velocity"
+    scan_time: float  # first to last trigger, in s
+    duration: float  # whole scan including lead, settling and the return move, in s
+    data_volume: float  # in bytes, all detectors
+    disk_throughput: float  # in bytes/s, all detectors
+
+    def summary(self):
+        return (
+            f"{self.num_images} projections over {self.start_deg} -> {self.stop_deg} deg "
+            f"(lead {self.lead_angle:.2f} deg)\n"
+            f"    exposure {self.exposure_time} s, step {self.step_time:.6f} s ({self.framerate:.2f} Hz, "
+            f"limited by {self.limited_by}), velocity {self.rot_motor_vel:.4f} deg/s\n"
+            f"    scan {self.scan_time:.2f} s, with overheads {self.duration:.2f} s; "
+            f"{self.data_volume / 1e9:.2f} GB at {self.disk_throughput / 1e6:.1f} MB/s"
+        )
+
+
+def solve_flyscan_timing(
+    exposure_time,
+    num_images,
+    start_deg=0,
+    stop_deg=180,
+    lead_angle=None,
+    max_framerate=None,
+    frame_bytes=0,
+    acceleration_time=0.0,
+    reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
+    return_move=True,
+):
+    """
+    Derive the flyscan velocity and trigger timing from the requested acquisition.
+
+    The time between projections is the longest of the exposure (plus
+    TOMO_FLYSCAN_OVERHEAD), the detector frame period (``max_framerate``) and what the
+    maximum scan velocity allows; the velocity is then chosen so that the
+    ``num_images`` projections span exactly ``start_deg`` to ``stop_deg``.
+    ``lead_angle`` defaults to the distance needed to accelerate (twice the ramp over
+    ``acceleration_time``). ``frame_bytes`` is the data size of one projection summed
+    over the detectors.
+
+    Raises ValueError for a setup that cannot be run: a lead angle shorter than the
+    ramp, a velocity above TOMO_ROTARY_STAGE_VELO_SCAN_MAX or a frame rate above
+    ``max_framerate``.
+    """
+    if num_images < 2:
+        raise ValueError("A flyscan needs at least 2 images.")
+    if exposure_time <= 0:
+        raise ValueError(f"The exposure time must be positive, not {exposure_time}.")
+    if stop_deg == start_deg:
+        raise ValueError("The flyscan range is empty, start_deg == stop_deg.")
+
+    angle_range = abs(stop_deg - start_deg)
+    step_angle = angle_range / (num_images - 1)
+    candidates = {
+        "exposure": exposure_time + TOMO_FLYSCAN_OVERHEAD,
+        "framerate": 1 / max_framerate if max_framerate else 0,
+        "velocity": step_angle / TOMO_ROTARY_STAGE_VELO_SCAN_MAX,
+    }
+    limited_by = max(candidates, key=candidates.get)
+    step_time = candidates[limited_by]
+    rot_motor_vel = step_angle / step_time
+    reset_speed = min(reset_speed, TOMO_ROTARY_STAGE_VELO_RESET_MAX)
+
+    # The step time is chosen within the limits; these only fail if the limits are wrong.
+    if rot_motor_vel > TOMO_ROTARY_STAGE_VELO_SCAN_MAX * (1 + 1e-9):
+        raise ValueError(
+            f"The flyscan velocity {rot_motor_vel:.4f} deg/s is above the limit of "
+            f"{TOMO_ROTARY_STAGE_VELO_SCAN_MAX} deg/s."
+        )
+    if max_framerate and 1 / step_time > max_framerate * (1 + 1e-9):
+        raise ValueError(
+            f"The frame rate {1 / step_time:.2f} Hz is above the detector maximum of "
+            f"{max_framerate} Hz."
+        )
+
+    ramp_angle = rot_motor_vel * acceleration_time / 2  # covered while accelerating
+    if lead_angle is None:
+        lead_angle = 2 * ramp_angle
+    elif lead_angle < ramp_angle:
+        raise ValueError(
+            f"The lead angle {lead_angle} deg is shorter than the {ramp_angle:.2f} deg "
+            f"the rotary stage needs to reach {rot_motor_vel:.2f} deg/s; use at least "
+            f"lead_angle={2 * ramp_angle:.2f}."
+        )
+
+    scan_time = (num_images - 1) * step_time
+    duration = (
+        (angle_range + 2 * lead_angle) / rot_motor_vel
+        + acceleration_time
+        + PH_SHUTTER_SETTLE_TIME
+    )
+    if return_move:
+        duration += (angle_range + 2 * lead_angle) / reset_speed + acceleration_time
+
+    return FlyscanTiming(
+        exposure_time=exposure_time,
+        num_images=num_images,
+        start_deg=start_deg,
+        stop_deg=stop_deg,
+        lead_angle=lead_angle,
+        step_time=step_time,
+        pulse_width=exposure_time / 5,
+        step_counts=step_angle * COUNTS_PER_DEG,
+        rot_motor_vel=rot_motor_vel,
+        reset_speed=reset_speed,
+        framerate=1 / step_time,
+        limited_by=limited_by,
+        scan_time=scan_time,
+        duration=duration,
+        data_volume=num_images * frame_bytes,
+        disk_throughput=frame_bytes / step_time,
+    )
+
+
+def _frame_bytes(detector):
+    """Size of one frame of an areaDetector, from its array size and data type ("UInt16" etc.)."""
+    size_x = yield from bps.rd(detector.drv.array_size_x)
+    size_y = yield from bps.rd(detector.drv.array_size_y)
+    data_type = yield from bps.rd(detector.drv.data_type)
+    bits = int(
+        "".join(c for c in getattr(data_type, "value", data_type) if c.isdigit())
+    )
+    return size_x * size_y * bits // 8
+
+
+def flyscan_timing(exposure_time, num_images, detectors=None, **kwargs):
+    """
+    Solve the flyscan timing (see solve_flyscan_timing) for the current state of the
+    detectors (readout mode, frame size) and of the rotary stage (acceleration).
+    """
+    if detectors is None:
+        detectors = [kinetix1]
+
+    framerates = []
+    frame_bytes = 0
+    for kinetix_det in detectors:
+        det_readout_mode = yield from bps.rd(kinetix_det.drv.readout_port_idx)
+        framerates.append(DETECTOR_MAX_FRAMERATES[det_readout_mode])
+        frame_bytes += yield from _frame_bytes(kinetix_det)
+    acceleration_time = yield from bps.rd(tomo_rot_axis.acceleration)
+
+    return solve_flyscan_timing(
+        exposure_time,
+        num_images,
+        max_framerate=min(framerates, default=None),
+        frame_bytes=frame_bytes,
+        acceleration_time=acceleration_time,
+        **kwargs,
+    )
+
+
+def tomo_flyscan_dry_run(
+    exposure_time,
+    num_images,
+    detectors=None,
+    start_deg=0,
+    stop_deg=180,
+    lead_angle=10,
+    reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
+    number_of_repetitions=1,
+    bidirectional=False,
+    pause_time=0,
+):
+    """
+    Print the timing, duration and data volume of tomo_flyscan (or of a tomo_loop with
+    ``number_of_repetitions``) without moving anything or taking data.
+
+    Raises ValueError if the scan cannot be run as requested, see solve_flyscan_timing.
+    """
+    timing = yield from flyscan_timing(
+        exposure_time,
+        num_images,
+        detectors=detectors,
+        start_deg=start_deg,
+        stop_deg=stop_deg,
+        lead_angle=lead_angle,
+        reset_speed=reset_speed,
+        return_move=not bidirectional,
+    )
+    print(timing.summary())
+    if number_of_repetitions > 1:
+        total_time = number_of_repetitions * (timing.duration + pause_time)
+        total_volume = number_of_repetitions * timing.data_volume
+        print(
+            f"    {number_of_repetitions} repetitions (without darks/flats): "
+            f"{total_time / 60:.1f} min, {total_volume / 1e9:.2f} GB"
+        )
+    return timing
+
 
 # def close_shutter():
 #     """Close the shutter after the scan."""
@@ -25,14 +240,130 @@ TOMO_ROTARY_STAGE_VELO_SCAN_MAX = 60
 #     yield from bps.sleep(2)
 
 
+# Detectors (and PandAs) kept staged by tomo_session(), see stage_for_scan/unstage_after_scan.
+_tomo_session_devices = []
+
+
+def _in_tomo_session(device):
+    return any(device is session_device for session_device in _tomo_session_devices)
+
+
+def tomo_session(plan, devices):
+    """
+    Run ``plan`` (e.g. repeated fly scans) with ``devices`` staged only once.
+
+    Scans inside the session skip the full stage/unstage cycle of these devices
+    (for the Kinetix that is switching to continuous mode and re-arming it after
+    every scan); they only close the files and disarm between scans. The devices
+    are unstaged at the end of the session, also if the plan fails.
+    """
+
+    def _session():
+        yield from bps.stage_all(*devices)
+        _tomo_session_devices[:] = devices
+        return (yield from plan)
+
+    def _cleanup():
+        _tomo_session_devices.clear()
+        yield from bps.unstage_all(*devices)
+
+    return (yield from bpp.finalize_wrapper(_session(), _cleanup()))
+
+
+def stage_for_scan(*devices):
+    """Stage the devices that are not kept staged by a tomo_session."""
+    yield from bps.stage_all(
+        *[device for device in devices if not _in_tomo_session(device)]
+    )
+
+
+def unstage_after_scan(*devices):
+    """Unstage the devices of one scan; those in a tomo_session only close their file and disarm."""
+    in_session = [device for device in devices if _in_tomo_session(device)]
+    if in_session:
+        yield from bps.wait_for(
+            [
+                lambda: asyncio.gather(
+                    *(device.writer.close() for device in in_session),
+                    *(device.controller.disarm() for device in in_session),
+                )
+            ]
+        )
+    yield from bps.unstage_all(
+        *[device for device in devices if not _in_tomo_session(device)]
+    )
+
+
+def _file_plugin(detector):
+    """The block writing the HDF file: PandA data block or areaDetector HDF plugin."""
+    return detector.data if hasattr(detector, "data") else detector.writer.hdf
+
+
+async def _file_written(detector, expected_frames):
+    plugin = _file_plugin(detector)
+    await wait_for_value(
+        plugin.num_captured, lambda captured: captured >= expected_frames, timeout=None
+    )
+    await wait_for_value(plugin.capture, False, timeout=None)
+
+
+def wait_for_files_written(expected_frames, timeout=60):
+    """
+    Wait until the HDF files of a scan are complete.
+
+    Returns as soon as every detector captured its expected number of frames and
+    closed its file. Raises a TimeoutError with the state of each detector if that
+    does not happen within ``timeout`` seconds.
+
+    Parameters
+    ----------
+    expected_frames : dict or list of (detector, number of frames) pairs
+    """
+    expected_frames = (
+        list(expected_frames.items())
+        if isinstance(expected_frames, dict)
+        else list(expected_frames)
+    )
+
+    async def barrier():
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *(
+                        _file_written(detector, frames)
+                        for detector, frames in expected_frames
+                    )
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            states = []
+            for detector, frames in expected_frames:
+                plugin = _file_plugin(detector)
+                captured, capturing = await asyncio.gather(
+                    plugin.num_captured.get_value(), plugin.capture.get_value()
+                )
+                states.append(
+                    f"{detector.name}: {captured}/{frames} frames captured, file {'open' if capturing else 'closed'}"
+                )
+            raise TimeoutError(
+                f"Files not written after {timeout} s ({'; '.join(states)})"
+            ) from None
+
+    (status,) = yield from bps.wait_for([barrier])
+    status.result()  # raises the TimeoutError
+
+
 def post_tomo_fly_cleanup():
     """Cleanup to perform at the end of every flyscan"""
 
-    yield from close_ph_shutter()
-    
+    # Only send the close command, the next plan does not have to wait for it.
+    yield from close_ph_shutter(wait=False)
+
     # Reset the velocity back to high.
     yield from bps.abs_set(tomo_rot_axis.velocity, TOMO_ROTARY_STAGE_VELO_RESET_MAX)
 
+
 @bpp.finalize_decorator(post_tomo_fly_cleanup)
 def tomo_dark_flat(
     exposure_time,
@@ -56,43 +387,49 @@ def tomo_dark_flat(
 
     dark_flat_start_uuid = yield from bps.open_run(md=_md)
 
-    print(f"\n=============================\n\nCollecting dark and flat images with scan number {RE.md['scan_id']}...")
+    print(
+        f"\n=============================\n\nCollecting dark and flat images with scan number {RE.md['scan_id']}..."
+    )
 
     #### DARKS ####
 
     # Collect dark frames:
     if use_shutter:
         yield from close_ph_shutter()
+        # No beam for the darks: move the sample out of the way for the flats meanwhile.
+        yield from bps.rel_set(sample_tower.axis_x1, offset, group="sample_out")
 
     for detector in detectors:
         detector._writer._path_provider._filename_provider.set_frame_type(
             TomoFrameType.dark
         )
 
-    yield from bps.stage_all(*detectors, kinetix_flyer)
-    dark_setup  =        StandardTriggerSetup(
-            num_frames=dark_images,
-            exposure_time=exposure_time,
-            software_trigger=True,
-        )
+    yield from stage_for_scan(*detectors, kinetix_flyer)
+    dark_setup = StandardTriggerSetup(
+        num_frames=dark_images,
+        exposure_time=exposure_time,
+        software_trigger=True,
+    )
     yield from bps.prepare(
         kinetix_flyer,
         dark_setup,
         wait=True,
     )
     for detector in detectors:
-        yield from bps.prepare(detector, kinetix_flyer.trigger_logic.trigger_info(dark_setup), wait=True)
-
-    for detector in detectors:
-        yield from inner_kinetix_collect(detector)
+        yield from bps.prepare(
+            detector, kinetix_flyer.trigger_logic.trigger_info(dark_setup), wait=True
+        )
 
+    yield from inner_kinetix_collect(*detectors)
 
-    yield from bps.unstage_all(kinetix_flyer, *detectors)
+    yield from unstage_after_scan(kinetix_flyer, *detectors)
 
     #### FLATS ####
 
-    # Move sample out of the way:
-    yield from bps.movr(sample_tower.axis_x1, offset)
+    # Move sample out of the way (if not done during the darks):
+    if not use_shutter:
+        yield from bps.rel_set(sample_tower.axis_x1, offset, group="sample_out")
+    yield from bps.wait(group="sample_out")
 
     # Collect flat images:
     if use_shutter:
@@ -103,13 +440,13 @@ def tomo_dark_flat(
             TomoFrameType.flat
         )
 
-    yield from bps.stage_all(*detectors, kinetix_flyer)
+    yield from stage_for_scan(*detectors, kinetix_flyer)
 
-    flat_setup =         StandardTriggerSetup(
-            num_frames=flat_images,
-            exposure_time=exposure_time,
-            software_trigger=True,
-        )
+    flat_setup = StandardTriggerSetup(
+        num_frames=flat_images,
+        exposure_time=exposure_time,
+        software_trigger=True,
+    )
 
     yield from bps.prepare(
         kinetix_flyer,
@@ -117,41 +454,254 @@ def tomo_dark_flat(
         wait=True,
     )
     for detector in detectors:
-        yield from bps.prepare(detector, kinetix_flyer.trigger_logic.trigger_info(flat_setup), wait=True)
+        yield from bps.prepare(
+            detector, kinetix_flyer.trigger_logic.trigger_info(flat_setup), wait=True
+        )
 
-    for detector in detectors:
-        yield from inner_kinetix_collect(detector)
+    yield from inner_kinetix_collect(*detectors)
+
+    # All flats are taken: move the sample back while the files and the run are closed.
+    if use_shutter:
+        yield from close_ph_shutter(wait=False)
+    yield from bps.rel_set(sample_tower.axis_x1, -offset, group="sample_in")
 
-    yield from bps.unstage_all(kinetix_flyer, *detectors)
+    yield from unstage_after_scan(kinetix_flyer, *detectors)
 
     yield from bps.close_run()
 
-    # Move sample back:
-    yield from bps.movr(sample_tower.axis_x1, -offset)
+    # Keep track of current dark/flat scan id here (both keys in one atomic write)
+    RE.md.update(
+        {
+            "current_dark_flat_scan_num": RE.md["scan_id"],
+            "current_dark_flat_scan_uid": dark_flat_start_uuid,
+        }
+    )
 
-    # Keep track of current dark/flat scan id here
-    RE.md['current_dark_flat_scan_num'] = RE.md['scan_id']
-    RE.md['current_dark_flat_scan_uid'] = dark_flat_start_uuid
+    yield from bps.wait(group="sample_in")
 
     print("====================================================\n\n")
-    print(f"Completed collection of dark and flat images with scan number: {RE.md['scan_id']}.")
+    print(
+        f"Completed collection of dark and flat images with scan number: {RE.md['scan_id']}."
+    )
     print("====================================================\n\n")
 
 
-def tomo_progress_bar(target, kinetix_detector):
-    current = yield from bps.rd(kinetix_detector.writer.hdf.num_captured)
+# Redis pub/sub channel with the live status of the running acquisition, for users
+# following the scan from the queue server rather than the IPython console.
+ACQUISITION_STATUS_CHANNEL = "hex:acquisition_status"
 
-    toolbar_width = 100
 
-    # setup toolbar
-    sys.stdout.write("[%s]" % (" " * toolbar_width))
-    sys.stdout.flush()
-    sys.stdout.write("\b" * (toolbar_width+1)) # return to start of line, after '['
+class AcquisitionStatusPublisher:
+    """
+    Publish acquisition statuses on a Redis channel from a worker thread.
 
-    sys.stdout.write("-" * int(toolbar_width * (target / current)))
-    sys.stdout.flush()
+    Calling the publisher only hands the status over, so the frame counter
+    callbacks on the bluesky event loop never wait for Redis; if Redis is slower
+    than the updates, only the latest status is sent. Nothing is stored under a
+    key: RE.md uses the same Redis client without a key prefix, so a key would
+    become metadata of every run.
+    """
 
-    sys.stdout.write("]\n")
+    def __init__(self, channel=ACQUISITION_STATUS_CHANNEL):
+        self.channel = channel
+        self._latest = None
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._failing = False
+        self._thread = threading.Thread(
+            target=self._run, name="acquisition-status", daemon=True
+        )
+        self._thread.start()
+
+    def __call__(self, status):
+        with self._lock:
+            self._latest = status
+            self._pending.set()
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            with self._lock:
+                status, self._latest = self._latest, None
+                self._pending.clear()
+            redis_client = getattr(RE.md, "redis_client", None)
+            if redis_client is None:
+                continue
+            try:
+                redis_client.publish(self.channel, json.dumps(status))
+            except Exception as error:
+                if not self._failing:
+                    print(f"\nCould not publish the acquisition status: {error!r}")
+                self._failing = True
+            else:
+                self._failing = False
+
+
+publish_acquisition_status = AcquisitionStatusPublisher()
+
+
+class AcquisitionMonitor:
+    """
+    Live progress of an acquisition, driven by subscriptions to frame counters.
+
+    ``counters`` maps a name to ``(signal, target_frames, frame_bytes)``, e.g. the
+    ``writer.hdf.num_captured`` of a Kinetix or the ``data.num_captured`` of a PandA.
+    Every ``refresh_period`` seconds at most (and only when a counter changes), the
+    frame rate, MB/s, ETA and the lag behind the furthest counter are shown and
+    passed to ``publish``. A warning is printed once per counter when it falls more
+    than ``lag_warning`` frames behind, which with the PandA as one of the counters
+    means that the detector is missing triggers.
+    """
+
+    def __init__(
+        self,
+        counters,
+        refresh_period=0.5,
+        rate_window=2.0,
+        lag_warning=10,
+        publish=publish_acquisition_status,
+        label="",
+    ):
+        self.counters = counters
+        self.refresh_period = refresh_period
+        self.rate_window = rate_window
+        self.lag_warning = lag_warning
+        self.publish = publish
+        self.label = label
+        self.start_time = None
+        self.warnings = []
+        self._history = {name: collections.deque() for name in counters}
+        self._callbacks = {}
+        self._lagging = set()
+        self._last_refresh = 0
+        self._interactive = sys.stdout.isatty()
+
+    def start(self):
+        self.start_time = ttime.monotonic()
+        for name, (signal, _, _) in self.counters.items():
+            callback = functools.partial(self._on_value, name)
+            self._callbacks[name] = callback
+            signal.subscribe_value(callback)
+
+    def stop(self):
+        """Unsubscribe and show (and publish) the final status, also returned."""
+        for name, callback in self._callbacks.items():
+            self.counters[name][0].clear_sub(callback)
+        self._callbacks.clear()
+        status = self.status(state="done")
+        for name, counter in status["counters"].items():
+            if counter["frames"] < counter["target"]:
+                self._warn(
+                    f"{name} captured {counter['frames']} of {counter['target']} frames"
+                )
+        status["warnings"] = self.warnings
+        self._show(status, final=True)
+        return status
+
+    def _on_value(self, name, value):
+        now = ttime.monotonic()
+        history = self._history[name]
+        history.append((now, value))
+        while len(history) > 2 and now - history[1][0] > self.rate_window:
+            history.popleft()
+        if now - self._last_refresh >= self.refresh_period:
+            self._last_refresh = now
+            self._show(self.status())
+
+    def status(self, state="running"):
+        now = ttime.monotonic()
+        frames = {
+            name: (history[-1][1] if history else 0)
+            for name, history in self._history.items()
+        }
+        leader = max(frames.values(), default=0)
+        counters = {}
+        for name, (_, target, frame_bytes) in self.counters.items():
+            history = self._history[name]
+            rate = 0.0
+            if len(history) > 1 and history[-1][0] > history[0][0]:
+                rate = (history[-1][1] - history[0][1]) / (
+                    history[-1][0] - history[0][0]
+                )
+            lag = leader - frames[name]
+            if lag > self.lag_warning and name not in self._lagging:
+                self._lagging.add(name)
+                self._warn(f"{name} is {lag} frames behind, frames may be dropped")
+            counters[name] = {
+                "frames": frames[name],
+                "target": target,
+                "fps": rate,
+                "mb_per_s": rate * frame_bytes / 1e6,
+                "eta": (target - frames[name]) / rate if rate > 0 else None,
+                "lag": lag,
+            }
+        return {
+            "label": self.label,
+            "state": state,
+            "time": ttime.time(),
+            "elapsed": now - self.start_time,
+            "counters": counters,
+            "warnings": self.warnings,
+        }
+
+    def _warn(self, message):
+        self.warnings.append(message)
+        print(f"\nWARNING: {message}" if self._interactive else f"WARNING: {message}")
+
+    def _show(self, status, final=False):
+        parts = []
+        for name, counter in status["counters"].items():
+            percent = (
+                100 * counter["frames"] / counter["target"]
+                if counter["target"]
+                else 100
+            )
+            eta = "" if counter["eta"] is None else f" ETA {counter['eta']:.1f} s"
+            parts.append(
+                f"{name} {counter['frames']}/{counter['target']} ({percent:.0f}%) "
+                f"{counter['fps']:.1f} fps {counter['mb_per_s']:.1f} MB/s{eta}"
+            )
+        line = f"{self.label} " * bool(self.label) + " | ".join(parts)
+        if self._interactive:
+            sys.stdout.write("\r" + line + ("\n" if final else ""))
+            sys.stdout.flush()
+        else:
+            print(line)
+        if self.publish is not None:
+            try:
+                self.publish(status)
+            except Exception as error:
+                # Never fail the scan for the status display.
+                print(f"Could not publish the acquisition status: {error!r}")
+                self.publish = None
+
+
+def monitor_acquisition(plan, counters, **kwargs):
+    """Run ``plan`` with an AcquisitionMonitor on ``counters`` (see there)."""
+    monitor = AcquisitionMonitor(counters, **kwargs)
+
+    def _stop():
+        monitor.stop()
+        yield from bps.null()
+
+    monitor.start()
+    return (yield from bpp.finalize_wrapper(plan, _stop()))
+
+
+def tomo_progress_bar(target, kinetix_detector, timeout=None):
+    """Show the progress of ``kinetix_detector`` until it has captured ``target`` frames."""
+    num_captured = kinetix_detector.writer.hdf.num_captured
+    frame_bytes = yield from _frame_bytes(kinetix_detector)
+    yield from monitor_acquisition(
+        bps.wait_for(
+            [
+                lambda: wait_for_value(
+                    num_captured, lambda value: value >= target, timeout
+                )
+            ]
+        ),
+        {kinetix_detector.name: (num_captured, target, frame_bytes)},
+    )
 
 
 def home_rotation_stage():
@@ -162,7 +712,6 @@ def home_rotation_stage():
     yield from bps.mv(tomo_rot_axis, 0)
 
 
-
 @bpp.finalize_decorator(post_tomo_fly_cleanup)
 def tomo_flyscan(
     exposure_time,
@@ -176,6 +725,8 @@ def tomo_flyscan(
     reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
     use_shutter=True,
     sample_name=None,
+    return_deg=None,
+    reverse=False,
 ):
     """Simple hardware triggered flyscan tomography
 
@@ -195,10 +746,15 @@ def tomo_flyscan(
         speed of the rotary motor during reset movements, in deg/s
     use_shutter : bool
         whether to use/check the shutter during the scan
+    return_deg : float (optional)
+        position to send the rotary stage to (at reset_speed) once the data are
+        taken and the shutter is closed, without waiting for it; the next
+        tomo_flyscan (or the plan calling it) has to wait for group 'tomo_return'
+    reverse : bool (optional)
+        rotate from 'stop_deg' to 'start_deg' instead; the direction is recorded
+        in the 'tomo_scan_direction' metadata
     """
 
-
-    overhead = 0.005
     if panda is None:
         panda = panda1
 
@@ -209,7 +765,8 @@ def tomo_flyscan(
         if (yield from bps.rd(fe_shutter_status)) != 1:
             raise RuntimeError(f"\n    Front-end shutter is closed. Reopen it!\n")
 
-        yield from open_ph_shutter()
+    # Return move started by the previous tomo_flyscan (if any):
+    yield from bps.wait(group="tomo_return")
 
     panda_detectors_and_flyers = [panda_flyer, panda]
     kinetix_detectors_and_flyers = [kinetix_flyer, *detectors]
@@ -219,30 +776,25 @@ def tomo_flyscan(
     panda_pcomp = dict(panda.pcomp.children())["1"]
     panda_pulser = dict(panda.pulse.children())["1"]
 
-    mtr_reset_vel = reset_speed
-    if mtr_reset_vel > TOMO_ROTARY_STAGE_VELO_RESET_MAX:
-        mtr_reset_vel = TOMO_ROTARY_STAGE_VELO_RESET_MAX
-
-    scan_time = (num_images - 1) * (exposure_time + overhead)
-    rot_motor_vel = (stop_deg - start_deg) / scan_time
-    if rot_motor_vel > TOMO_ROTARY_STAGE_VELO_SCAN_MAX:
-        rot_motor_vel = TOMO_ROTARY_STAGE_VELO_SCAN_MAX
-        scan_time = abs(stop_deg - start_deg) / rot_motor_vel
-
-    step_time = scan_time / (num_images - 1)
-
-    framerate = 1 / step_time
-
-    for kinetix_det in detectors:
-        det_readout_mode = yield from bps.rd(kinetix_det.drv.readout_port_idx)
-        if framerate > DETECTOR_MAX_FRAMERATES[det_readout_mode]:
-            step_time = 1 / DETECTOR_MAX_FRAMERATES[det_readout_mode]
+    # The rotation goes from first_deg to last_deg, in the direction of 'sign':
+    if reverse:
+        first_deg, last_deg, sign = stop_deg, start_deg, -1
+    else:
+        first_deg, last_deg, sign = start_deg, stop_deg, 1
 
-    if exposure_time is not None:
-        if exposure_time > step_time:
-            raise RuntimeError(
-                f"Your configured exposure time is longer than the time per step {step_time} seconds!"
-            )
+    timing = yield from flyscan_timing(
+        exposure_time,
+        num_images,
+        detectors=detectors,
+        start_deg=start_deg,
+        stop_deg=stop_deg,
+        lead_angle=lead_angle,
+        reset_speed=reset_speed,
+        return_move=return_deg is not None,
+    )
+    print(timing.summary())
+    mtr_reset_vel = timing.reset_speed
+    rot_motor_vel = timing.rot_motor_vel
 
     # step_width_counts = COUNTS_PER_REVOLUTION / (
     #    (DEG_PER_REVOLUTION / (stop_deg - start_deg)) * (num_images - 1)
@@ -258,36 +810,58 @@ def tomo_flyscan(
         software_trigger=False,
     )
 
+    start_encoder = first_deg * COUNTS_PER_DEG - ZERO_OFFSET
+
+    # Set up the pcomp block (and the pulser) while moving to the start position,
+    # writing only what changed since the previous scan.
+    panda_settings = [
+        (panda_pcomp.start, int(start_encoder)),
+        (panda_pcomp.dir, "Negative" if reverse else "Positive"),
+        # Uncomment if using gate trigger mode on camera
+        (
+            panda_pcomp.width,
+            3,
+        ),  # step_width_counts - 1; Width in encoder counts that the pulse will be high
+        # (panda1_pcomp_1.step, step_width_counts),
+    ]
+    if time_trigger:
+        panda_settings += [
+            (panda_pcomp.pulses, 1),
+            (panda_pulser.pulses, num_images),
+            (panda_pulser.step, timing.step_time),
+            (panda_pulser.width, timing.pulse_width),
+        ]
+    else:
+        panda_settings += [(panda_pcomp.pulses, num_images)]
+
     # Make it fast to move to the start position:
-    yield from bps.mv(tomo_rot_axis.velocity, reset_speed)
-    yield from bps.mv(tomo_rot_axis, start_deg - lead_angle)
+    yield from set_signals([(tomo_rot_axis.velocity, mtr_reset_vel)])
+    yield from bps.abs_set(
+        tomo_rot_axis, first_deg - sign * lead_angle, group="tomo_setup"
+    )
+    yield from set_signals(panda_settings, group="tomo_setup")
     # Set the velocity for the scan:
-    yield from bps.mv(tomo_rot_axis.velocity, rot_motor_vel)
-    start_encoder = start_deg * COUNTS_PER_DEG - ZERO_OFFSET
+    yield from set_signals([(tomo_rot_axis.velocity, rot_motor_vel)])
 
-    # Set up the pcomp block
-    yield from bps.mv(panda_pcomp.start, int(start_encoder))
-
-    # Uncomment if using gate trigger mode on camera
-    yield from bps.mv(
-        panda_pcomp.width, 3  # step_width_counts - 1
-    )  # Width in encoder counts that the pulse will be high
-    # yield from bps.mv(panda1_pcomp_1.step, step_width_counts)
-    if time_trigger:
-        yield from bps.mv(panda_pcomp.pulses, 1)
-        yield from bps.mv(panda_pulser.pulses, num_images)
-        yield from bps.mv(panda_pulser.step, step_time)
-        yield from bps.mv(panda_pulser.width, exposure_time / 5)
-    else:
-        yield from bps.mv(panda_pcomp.pulses, num_images)
+    # The shutter only opens once the stage is in position; it opens while the detectors are prepared.
+    if use_shutter:
+        yield from open_ph_shutter(wait=False)
 
-    _md = {    
+    _md = {
         "detectors": [det.name for det in detectors],
         "num_points": num_images,
         "plan_name": "tomo_flyscan",
         "hints": {},
     }
     _md.update({"tomo_scanning_mode": ScanType.tomo_flyscan.value})
+    # Projections are in acquisition order; reverse scans go from stop_deg to start_deg.
+    _md.update(
+        {
+            "tomo_scan_direction": "reverse" if reverse else "forward",
+            "tomo_start_deg": first_deg,
+            "tomo_stop_deg": last_deg,
+        }
+    )
     yield from bps.open_run(md=_md)
 
     print(f"Executing tomography scan with number number: {RE.md['scan_id']}...\n")
@@ -299,8 +873,8 @@ def tomo_flyscan(
         if hasattr(kinetix_det.writer.hdf, "queue_size"):
             yield from bps.mv(kinetix_det.writer.hdf.queue_size, num_images * 2)
 
-    # Stage All!
-    yield from bps.stage_all(*all_detectors)
+    # Stage All! (except the detectors kept staged by a tomo_session)
+    yield from stage_for_scan(*all_detectors)
 
     # Set HDF plugin numcapture to num_images
     for kinetix_det in detectors:
@@ -310,7 +884,9 @@ def tomo_flyscan(
     yield from bps.prepare(kinetix_flyer, det_exp_setup, wait=True)
     for kinetix_det in detectors:
         yield from bps.prepare(
-            kinetix_det, kinetix_flyer.trigger_logic.trigger_info(det_exp_setup), wait=True
+            kinetix_det,
+            kinetix_flyer.trigger_logic.trigger_info(det_exp_setup),
+            wait=True,
         )
 
     assert panda_flyer._trigger_logic.state == StandardTriggerState.stopping
@@ -319,101 +895,185 @@ def tomo_flyscan(
         panda, panda_flyer.trigger_logic.trigger_info(num_images), wait=True
     )
 
-    for flyer_or_det in all_detectors:
-        yield from bps.kickoff(flyer_or_det)
-
-    # Move rotation axis to the stop position + the lead angle:
-    yield from bps.mv(tomo_rot_axis, stop_deg + lead_angle)
-
-    print("Completing...")
-    for flyer_or_det in all_detectors:
-        yield from bps.complete(flyer_or_det, group="complete_all")
-
-    # Wait for completion of file saving for the Kinetix detectors and the PandA
-    done = False
-    while not done:
-        try:
-            yield from bps.wait(group="complete_all", timeout=2.0)
-        except TimeoutError:
-            pass
-        else:
-            done = True
+    if use_shutter:
+        yield from bps.wait(group="ph_shutter_open")
 
-    panda_stream_name = f"{panda.name}_stream"
-    yield from bps.declare_stream(panda, name=panda_stream_name)
+    def _rotate_and_collect():
+        for flyer_or_det in all_detectors:
+            yield from bps.kickoff(flyer_or_det)
 
-    yield from bps.collect(
-        panda,
-        # stream=True,
-        # return_payload=False,
-        name=panda_stream_name,
-    )
+        # Move rotation axis past the last position by the lead angle, collecting while it rotates:
+        yield from bps.abs_set(
+            tomo_rot_axis, last_deg + sign * lead_angle, group="rotation"
+        )
 
-    yield from bps.unstage_all(*panda_detectors_and_flyers)
+        # Wait for completion of file saving for the Kinetix detectors and the PandA
+        yield from collect_while_completing(
+            [panda_flyer, kinetix_flyer],
+            [panda, *detectors],
+            lambda detector: f"{detector.name}_stream",
+        )
 
+    # Live progress, the PandA counts the triggers sent to the detectors:
+    progress_counters = {panda.name: (panda.data.num_captured, num_images, 0)}
     for kinetix_det in detectors:
-        detector_stream_name = f"{kinetix_det.name}_stream"
-        yield from bps.declare_stream(kinetix_det, name=detector_stream_name)
-
-        yield from bps.collect(
-            kinetix_det,
-            # stream=True,
-            # return_payload=False,
-            name=detector_stream_name,
+        frame_bytes = yield from _frame_bytes(kinetix_det)
+        progress_counters[kinetix_det.name] = (
+            kinetix_det.writer.hdf.num_captured,
+            num_images,
+            frame_bytes,
         )
-        yield from bps.sleep(0.1)
 
-    yield from bps.unstage_all(*kinetix_detectors_and_flyers)
+    print("Completing...")
+    yield from monitor_acquisition(
+        _rotate_and_collect(), progress_counters, label=f"scan {RE.md['scan_id']}:"
+    )
+
+    # All frames are in: close the shutter, stop the PandA triggering and send the
+    # stage back while the detector files are finalised.
+    if use_shutter:
+        yield from close_ph_shutter(wait=False)
+    yield from unstage_after_scan(*panda_detectors_and_flyers)
+    yield from bps.wait(group="rotation")
+    yield from set_signals([(tomo_rot_axis.velocity, mtr_reset_vel)])
+    if return_deg is not None:
+        if use_shutter:
+            # Do not rotate the sample back through the beam.
+            yield from bps.wait(group="ph_shutter_close")
+        yield from bps.abs_set(tomo_rot_axis, return_deg, group="tomo_return")
+
+    yield from unstage_after_scan(*kinetix_detectors_and_flyers)
 
     yield from bps.close_run()
-    
+
     print("====================================================")
     print("====================================================\n\n")
     print(f"Completed tomography scan with scan number: {RE.md['scan_id']}.\n")
     print("====================================================")
     print("====================================================\n\n")
 
-
-
     # Print out number of points captured by each detector
     captured = {}
     captured[panda.name] = yield from bps.rd(panda.data.num_captured)
     for kinetix_det in detectors:
-        captured[kinetix_det.name] = yield from bps.rd(kinetix_det.writer.hdf.num_captured)
-    
+        captured[kinetix_det.name] = yield from bps.rd(
+            kinetix_det.writer.hdf.num_captured
+        )
+
     print("Number frames captured:\n")
     for cap in captured.keys():
         print(f"    {cap:15}: {captured[cap]}")
 
 
-
 def tomo_loop(
+    number_of_repetitions,
+    exposure_time,
+    dark_flat_offset,
+    num_projections,
+    pause_time=0,
+    panda=None,
+    detectors=None,
+    skip_tomo_num=-1,
+    time_trigger=True,
+    start_deg=0,
+    stop_deg=180,
+    lead_angle=10,
+    reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
+    use_shutter=True,
+    num_flat_images=50,
+    num_dark_images=20,
+    keep_staged=True,
+    bidirectional=False,
+):
+    """
+    Repeated tomo flyscans with darks/flats.
+
+    After each flyscan the loop continues as soon as the files are written (see
+    wait_for_files_written); ``pause_time`` is an optional minimum time in seconds
+    between the end of a flyscan and the next one. With ``keep_staged`` the
+    detectors stay staged in between. With ``bidirectional`` every second flyscan
+    rotates back from ``stop_deg`` to ``start_deg`` instead of returning the stage
+    first (see the 'tomo_scan_direction' metadata).
+    """
+
+    if panda is None:
+        panda = panda1
+    if detectors is None:
+        detectors = [kinetix1]
+
+    loop = _tomo_loop(
         number_of_repetitions,
         exposure_time,
         dark_flat_offset,
         num_projections,
         pause_time,
-        panda=None,
-        detectors=None,
-        skip_tomo_num=-1,
-        time_trigger=True,
-        start_deg=0,
-        stop_deg=180,
-        lead_angle=10,
-        reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
-        use_shutter=True,
-        num_flat_images = 50,
-        num_dark_images = 20,
-    ):
+        panda,
+        detectors,
+        skip_tomo_num,
+        time_trigger,
+        start_deg,
+        stop_deg,
+        lead_angle,
+        reset_speed,
+        use_shutter,
+        num_flat_images,
+        num_dark_images,
+        bidirectional,
+    )
+    if keep_staged:
+        loop = tomo_session(loop, [panda, *detectors])
+    yield from loop
+
+
+def _tomo_loop(
+    number_of_repetitions,
+    exposure_time,
+    dark_flat_offset,
+    num_projections,
+    pause_time,
+    panda,
+    detectors,
+    skip_tomo_num,
+    time_trigger,
+    start_deg,
+    stop_deg,
+    lead_angle,
+    reset_speed,
+    use_shutter,
+    num_flat_images,
+    num_dark_images,
+    bidirectional,
+):
 
     scan_countdown = skip_tomo_num
-    
-    yield from tomo_dark_flat(exposure_time, dark_flat_offset, detectors=detectors, use_shutter=use_shutter, dark_images=num_dark_images, flat_images=num_flat_images)
+
+    # Check the timing (and print the expected duration) before taking any data:
+    yield from tomo_flyscan_dry_run(
+        exposure_time,
+        num_projections,
+        detectors=detectors,
+        start_deg=start_deg,
+        stop_deg=stop_deg,
+        lead_angle=lead_angle,
+        reset_speed=reset_speed,
+        number_of_repetitions=number_of_repetitions,
+        bidirectional=bidirectional,
+        pause_time=pause_time,
+    )
+
+    yield from tomo_dark_flat(
+        exposure_time,
+        dark_flat_offset,
+        detectors=detectors,
+        use_shutter=use_shutter,
+        dark_images=num_dark_images,
+        flat_images=num_flat_images,
+    )
 
     for i in range(number_of_repetitions):
 
         print(f"Executing tomo flyscan iteration #{i+1}...")
-        
+
         yield from tomo_flyscan(
             exposure_time,
             num_projections,
@@ -425,55 +1085,161 @@ def tomo_loop(
             lead_angle=lead_angle,
             reset_speed=reset_speed,
             use_shutter=use_shutter,
+            # Bidirectional scans end where the next one starts, there is nothing to return.
+            return_deg=None if bidirectional else start_deg - lead_angle,
+            reverse=bidirectional and i % 2 == 1,
         )
 
-        # Sleep to wait for file saving to complete
-        yield from bps.sleep(pause_time)
+        # Wait for file saving to complete
+        scan_end = ttime.monotonic()
+        yield from wait_for_files_written(
+            [(panda, num_projections)] + [(det, num_projections) for det in detectors]
+        )
+        remaining_pause = pause_time - (ttime.monotonic() - scan_end)
+        if remaining_pause > 0:
+            yield from bps.sleep(remaining_pause)
 
         if skip_tomo_num > 0:
             scan_countdown -= 1
 
             if scan_countdown == 0:
                 print("Taking dark, flat...")
-                yield from tomo_dark_flat(exposure_time, dark_flat_offset, detectors=detectors, use_shutter=use_shutter, dark_images=num_dark_images, flat_images=num_flat_images)
-                scan_countdown = skip_tomo_num        
+                yield from tomo_dark_flat(
+                    exposure_time,
+                    dark_flat_offset,
+                    detectors=detectors,
+                    use_shutter=use_shutter,
+                    dark_images=num_dark_images,
+                    flat_images=num_flat_images,
+                )
+                scan_countdown = skip_tomo_num
+
+    yield from tomo_dark_flat(
+        exposure_time,
+        dark_flat_offset,
+        detectors=detectors,
+        use_shutter=use_shutter,
+        dark_images=num_dark_images,
+        flat_images=num_flat_images,
+    )
 
+    # Return move of the last flyscan:
+    yield from bps.wait(group="tomo_return")
 
-    yield from tomo_dark_flat(exposure_time, dark_flat_offset, detectors=detectors, use_shutter=use_shutter, dark_images=num_dark_images, flat_images=num_flat_images)
 
+def tomo_y_scan_loop(
+    exposure_time,
+    dark_flat_offset,
+    num_projections,
+    y_motion_start,
+    y_motion_stop,
+    y_motion_step,
+    panda=None,
+    detectors=None,
+    skip_tomo_num=-1,
+    time_trigger=True,
+    start_deg=0,
+    stop_deg=180,
+    lead_angle=10,
+    reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
+    use_shutter=True,
+    num_flat_images=50,
+    num_dark_images=20,
+    keep_staged=True,
+    bidirectional=False,
+):
+    """
+    Tomo flyscans at several sample heights.
 
+    With ``keep_staged`` the detectors stay staged in between; with ``bidirectional``
+    every second flyscan rotates back from ``stop_deg`` to ``start_deg``.
+    """
 
-def tomo_y_scan_loop(
+    if panda is None:
+        panda = panda1
+    if detectors is None:
+        detectors = [kinetix1]
+
+    loop = _tomo_y_scan_loop(
         exposure_time,
         dark_flat_offset,
         num_projections,
         y_motion_start,
         y_motion_stop,
         y_motion_step,
-        panda=None,
-        detectors=None,
-        skip_tomo_num=-1,
-        time_trigger=True,
-        start_deg=0,
-        stop_deg=180,
-        lead_angle=10,
-        reset_speed=TOMO_ROTARY_STAGE_VELO_RESET_MAX,
-        use_shutter=True,
-        num_flat_images = 50,
-        num_dark_images = 20,
-    ):
+        panda,
+        detectors,
+        skip_tomo_num,
+        time_trigger,
+        start_deg,
+        stop_deg,
+        lead_angle,
+        reset_speed,
+        use_shutter,
+        num_flat_images,
+        num_dark_images,
+        bidirectional,
+    )
+    if keep_staged:
+        loop = tomo_session(loop, [panda, *detectors])
+    yield from loop
+
+
+def _tomo_y_scan_loop(
+    exposure_time,
+    dark_flat_offset,
+    num_projections,
+    y_motion_start,
+    y_motion_stop,
+    y_motion_step,
+    panda,
+    detectors,
+    skip_tomo_num,
+    time_trigger,
+    start_deg,
+    stop_deg,
+    lead_angle,
+    reset_speed,
+    use_shutter,
+    num_flat_images,
+    num_dark_images,
+    bidirectional,
+):
 
     scan_countdown = skip_tomo_num
 
     pre_scan_position = sample_tower.vertical_y.user_readback.get()
 
+    num_steps = int(abs(y_motion_start - y_motion_stop) / abs(y_motion_step))
+    last_step = abs(y_motion_start - y_motion_stop) % abs(y_motion_step)
+
+    # Check the timing (and print the expected duration) before taking any data:
+    yield from tomo_flyscan_dry_run(
+        exposure_time,
+        num_projections,
+        detectors=detectors,
+        start_deg=start_deg,
+        stop_deg=stop_deg,
+        lead_angle=lead_angle,
+        reset_speed=reset_speed,
+        number_of_repetitions=num_steps,
+        bidirectional=bidirectional,
+    )
+
     yield from bps.mv(sample_tower.vertical_y, y_motion_start)
 
-    yield from tomo_dark_flat(exposure_time, dark_flat_offset, detectors=detectors, use_shutter=use_shutter, dark_images=num_dark_images, flat_images=num_flat_images)
+    yield from tomo_dark_flat(
+        exposure_time,
+        dark_flat_offset,
+        detectors=detectors,
+        use_shutter=use_shutter,
+        dark_images=num_dark_images,
+        flat_images=num_flat_images,
+    )
 
-    num_steps = int(abs(y_motion_start - y_motion_stop) / abs(y_motion_step))
-    last_step = abs(y_motion_start - y_motion_stop) % abs(y_motion_step)
-    print(f"Your last step will be {last_step}, since the y_step did not divide evenly.")
+    print(
+        f"Your last step will be {last_step}, since the y_step did not divide evenly."
+    )
 
     if y_motion_start > y_motion_stop:
         direction = -1
@@ -483,7 +1249,7 @@ def tomo_y_scan_loop(
     for i in range(num_steps):
 
         print(f"Executing tomo flyscan iteration #{i+1}...")
-        
+
         yield from tomo_flyscan(
             exposure_time,
             num_projections,
@@ -495,9 +1261,15 @@ def tomo_y_scan_loop(
             lead_angle=lead_angle,
             reset_speed=reset_speed,
             use_shutter=use_shutter,
+            # Bidirectional scans end where the next one starts, there is nothing to return.
+            return_deg=None if bidirectional else start_deg - lead_angle,
+            reverse=bidirectional and i % 2 == 1,
         )
 
-        # Sleep to wait for file saving to complete
+        # Wait for file saving to complete
+        yield from wait_for_files_written(
+            [(panda, num_projections)] + [(det, num_projections) for det in detectors]
+        )
         yield from bps.movr(sample_tower.vertical_y, abs(y_motion_step) * direction)
 
         if skip_tomo_num > 0:
@@ -505,13 +1277,29 @@ def tomo_y_scan_loop(
 
             if scan_countdown == 0:
                 print("Taking dark, flat...")
-                yield from tomo_dark_flat(exposure_time, dark_flat_offset, detectors=detectors, use_shutter=use_shutter, dark_images=num_dark_images, flat_images=num_flat_images)
-                scan_countdown = skip_tomo_num        
-
-
-    yield from tomo_dark_flat(exposure_time, dark_flat_offset, detectors=detectors, use_shutter=use_shutter, dark_images=num_dark_images, flat_images=num_flat_images)
+                yield from tomo_dark_flat(
+                    exposure_time,
+                    dark_flat_offset,
+                    detectors=detectors,
+                    use_shutter=use_shutter,
+                    dark_images=num_dark_images,
+                    flat_images=num_flat_images,
+                )
+                scan_countdown = skip_tomo_num
+
+    yield from tomo_dark_flat(
+        exposure_time,
+        dark_flat_offset,
+        detectors=detectors,
+        use_shutter=use_shutter,
+        dark_images=num_dark_images,
+        flat_images=num_flat_images,
+    )
 
     yield from bps.mv(sample_tower.vertical_y, pre_scan_position)
 
+    # Return move of the last flyscan:
+    yield from bps.wait(group="tomo_return")
+
 
 file_loading_timer.stop_timer(__file__)
@@ -0,0 +1,356 @@
+file_loading_timer.start_timer(__file__)
+
+
+import shutil
+import tracemalloc
+
+from bluesky.callbacks.best_effort import BestEffortCallback
+
+HEX_BENCHMARK_DIR = (
+    HEX_SIM_DATA_DIR / "benchmarks"
+    if HEX_SIMULATION
+    else Path("/nsls2/data/hex/shared/config/benchmarks")
+)
+
+# Plans whose document streams are benchmarked, with small but representative arguments.
+BENCHMARK_PLANS = {
+    "tomo_flyscan": lambda: tomo_flyscan(0.01, 200, use_shutter=False),
+    "tomo_dark_flat": lambda: tomo_dark_flat(
+        0.01, 1, dark_images=20, flat_images=50, use_shutter=False
+    ),
+    "count_germ": lambda: count_germ(0.1, num=10),
+    "sweep_motion": lambda: sweep_motion(
+        germ_detector,
+        0.1,
+        sample_tower.axis_z1,
+        7,
+        7.5,
+        max_moves=5,
+        md={"calibrant": "benchmark"},
+    ),
+}
+
+
+class KafkaStandIn:
+    """Serializes documents like the Kafka publisher (msgpack) without a broker."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def __call__(self, name, doc):
+        message = msgpack.packb((name, doc), default=_encode_default)
+        self.messages += 1
+        self.bytes += len(message)
+
+
+def benchmark_subscribers(workdir):
+    """
+    The subscribers the RunEngine calls in the profile: bec and the document spool.
+
+    The exporter is included as well, since it is subscribed (as ``jlw``) when
+    documents are exported. Tiled and Kafka are fed by the spool uploaders, see
+    benchmark_uploaders().
+    """
+    workdir = Path(workdir)
+    # A separate instance configured like the session's bec, which is left alone.
+    best_effort = BestEffortCallback()
+    best_effort.disable_plots()
+    best_effort.disable_table()
+    best_effort.disable_baseline()
+    return {
+        "bec": best_effort,
+        "spool": DocumentSpool(workdir / "spool"),
+        "exporter": DocumentExporter(workdir / "jsonl"),
+    }
+
+
+def benchmark_uploaders(workdir):
+    """
+    The spool uploaders of the profile, ``{label: (callback, options)}``.
+
+    A local Tiled server and a serializing stand-in replace the beamline's Tiled
+    and Kafka.
+    """
+    workdir = Path(workdir)
+    return {
+        "tiled uploader": (
+            TiledWriter(local_tiled_client(workdir / "tiled")),
+            {"merge_stream_datum": True},
+        ),
+        "kafka uploader": (KafkaStandIn(), {}),
+    }
+
+
+def _close_subscribers(subscribers):
+    for subscriber in subscribers.values():
+        if isinstance(subscriber, (DocumentSpool, DocumentExporter)):
+            subscriber.close()
+
+
+def record_benchmark_streams(plans=None, directory=HEX_BENCHMARK_DIR / "streams"):
+    """
+    Run the benchmark plans in simulation mode and export their document streams.
+
+    Each plan's runs are written to ``<directory>/<plan name>/``, replacing any
+    previous recording. Streams exported at the beamline with DocumentExporter
+    can be copied there as well.
+    """
+    if not HEX_SIMULATION:
+        raise RuntimeError(
+            "Recording benchmark streams needs simulated devices, set HEX_PROFILE_SIMULATION=1."
+        )
+    for plan_name in plans or BENCHMARK_PLANS:
+        plan_dir = Path(directory) / plan_name
+        shutil.rmtree(plan_dir, ignore_errors=True)
+        exporter = DocumentExporter(plan_dir)
+        token = RE.subscribe(exporter)
+        try:
+            RE(BENCHMARK_PLANS[plan_name]())
+        finally:
+            RE.unsubscribe(token)
+            exporter.close()
+        print(
+            f"Recorded {plan_name}: {', '.join(path.name for path in exporter.files.values())}"
+        )
+
+
+def _replay(documents, callbacks, speed):
+    """Pass ``documents`` through ``callbacks``; returns the elapsed time."""
+    start = ttime.perf_counter()
+    first_doc_time = None
+    for name, doc in documents:
+        doc_time = (
+            doc.get("time") if isinstance(doc.get("time"), (int, float)) else None
+        )
+        if speed and doc_time is not None:
+            if first_doc_time is None:
+                first_doc_time = doc_time
+            delay = (doc_time - first_doc_time) / speed - (ttime.perf_counter() - start)
+            if delay > 0:
+                ttime.sleep(delay)
+        for callback in callbacks:
+            callback(name, doc)
+    return ttime.perf_counter() - start
+
+
+def replay_documents(documents, make_subscribers, speed=None):
+    """
+    Pass ``documents`` through subscribers and measure them.
+
+    ``make_subscribers(name)`` returns a fresh ``{label: callback}`` stack; it is
+    called twice, since the documents are replayed twice: once timed, and once,
+    as fast as possible, under tracemalloc for the peak memory (tracing would
+    slow down the timed replay several times over).
+
+    With ``speed=None`` the timed replay runs as fast as possible, otherwise at
+    ``speed`` times the pace recorded in the timestamps (1.0 is real time).
+    """
+    profiler = CallbackProfiler(max_samples=len(documents))
+    subscribers = make_subscribers("timed")
+    callbacks = [
+        profiler.wrap(callback, label) for label, callback in subscribers.items()
+    ]
+    try:
+        elapsed = _replay(documents, callbacks, speed)
+    finally:
+        _close_subscribers(subscribers)
+
+    subscribers = make_subscribers("memory")
+    tracemalloc.start()
+    try:
+        _replay(documents, list(subscribers.values()), None)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        _close_subscribers(subscribers)
+
+    subscriber_stats = collections.defaultdict(dict)
+    for label, name, calls, p50, p99, maximum in profiler.table():
+        subscriber_stats[label][name] = {
+            "calls": calls,
+            "p50": p50,
+            "p99": p99,
+            "max": maximum,
+        }
+    return {
+        "documents": len(documents),
+        "elapsed": elapsed,
+        "documents_per_second": len(documents) / elapsed if elapsed else float("inf"),
+        "peak_memory_mb": peak_memory / 1024**2,
+        "subscribers": dict(subscriber_stats),
+    }
+
+
+def replay_uploaders(documents, make_uploaders, workdir, timeout=600):
+    """
+    Spool ``documents``, then time how long each uploader takes to deliver them.
+
+    ``make_uploaders()`` returns ``{label: (callback, options)}`` (see
+    benchmark_uploaders()); the uploaders run one after the other, each from
+    the start of the spool, so their timings do not include each other. Returns
+    the elapsed time and throughput per uploader, and the per-document latencies
+    of their callbacks in the layout of replay_documents()' ``subscribers``.
+    """
+    spool = DocumentSpool(Path(workdir) / "spool")
+    profiler = CallbackProfiler(max_samples=len(documents))
+    uploaders = {}
+    try:
+        for name, doc in documents:
+            spool(name, doc)
+        spool.flush()
+        for label, (callback, options) in make_uploaders().items():
+            start = ttime.perf_counter()
+            uploader = spool.add_uploader(
+                label.replace(" ", "-"), profiler.wrap(callback, label), **options
+            )
+            while not uploader.caught_up():
+                if ttime.perf_counter() - start > timeout:
+                    raise TimeoutError(f"{label} did not catch up in {timeout} s")
+                ttime.sleep(0.01)
+            elapsed = ttime.perf_counter() - start
+            uploaders[label] = {
+                "delivered": uploader.delivered,
+                "rejected": uploader.rejected,
+                "elapsed": elapsed,
+                "documents_per_second": (
+                    len(documents) / elapsed if elapsed else float("inf")
+                ),
+            }
+    finally:
+        spool.close()
+
+    subscriber_stats = collections.defaultdict(dict)
+    for label, name, calls, p50, p99, maximum in profiler.table():
+        subscriber_stats[label][name] = {
+            "calls": calls,
+            "p50": p50,
+            "p99": p99,
+            "max": maximum,
+        }
+    return {"uploaders": uploaders, "subscribers": dict(subscriber_stats)}
+
+
+def compare_benchmark_to_baseline(
+    results, baseline_path, threshold=0.2, min_delta=0.0005
+):
+    """
+    Flag regressions of ``results`` against a stored benchmark result.
+
+    The throughput (of the RunEngine subscribers, or of an uploader) regressed
+    if it dropped by more than ``threshold`` (relative); a subscriber or uploader
+    regressed if its p99 latency for a document type grew by more than
+    ``threshold`` (relative) and ``min_delta`` seconds (absolute).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = {}
+    before, after = baseline["documents_per_second"], results["documents_per_second"]
+    if after < before * (1 - threshold):
+        regressions["documents_per_second"] = {"baseline": before, "current": after}
+    for label, stats in results.get("uploaders", {}).items():
+        base = baseline.get("uploaders", {}).get(label)
+        if base and stats["documents_per_second"] < base["documents_per_second"] * (
+            1 - threshold
+        ):
+            regressions[f"{label} documents_per_second"] = {
+                "baseline": base["documents_per_second"],
+                "current": stats["documents_per_second"],
+            }
+    for label, per_doc in results["subscribers"].items():
+        for name, stats in per_doc.items():
+            base = baseline["subscribers"].get(label, {}).get(name)
+            if (
+                base
+                and stats["p99"] - base["p99"] > min_delta
+                and stats["p99"] > base["p99"] * (1 + threshold)
+            ):
+                regressions[f"{label}/{name} p99"] = {
+                    "baseline": base["p99"],
+                    "current": stats["p99"],
+                }
+
+    for key, values in regressions.items():
+        print(
+            f"REGRESSION: {results['plan']} {key} is {values['current']:.6g} (baseline {values['baseline']:.6g})"
+        )
+    return regressions
+
+
+def run_replay_benchmarks(
+    plans=None, speed=None, directory=HEX_BENCHMARK_DIR, update_baseline=False
+):
+    """
+    Replay the recorded streams of the benchmark plans through the subscriber stack.
+
+    The RunEngine subscribers (benchmark_subscribers()) are measured as the
+    documents are emitted; the uploaders behind the spool
+    (benchmark_uploaders()) are measured separately, delivering the spooled
+    streams. The results are stored as ``<directory>/results/<plan>-<timestamp>.json`` and
+    compared with ``<directory>/baseline/<plan>.json`` if it exists (or become
+    the baseline with ``update_baseline=True``). Returns the results per plan.
+    """
+    directory = Path(directory)
+    all_results = {}
+    for plan_name in plans or BENCHMARK_PLANS:
+        paths = sorted((directory / "streams" / plan_name).glob("scan_*"))
+        if not paths:
+            print(
+                f"No recorded streams for {plan_name}, see record_benchmark_streams()."
+            )
+            continue
+        documents = [item for path in paths for item in read_documents(path)]
+        with tempfile.TemporaryDirectory() as workdir:
+            results = replay_documents(
+                documents,
+                lambda name: benchmark_subscribers(Path(workdir) / name),
+                speed=speed,
+            )
+            upload_results = replay_uploaders(
+                documents,
+                lambda: benchmark_uploaders(Path(workdir) / "uploaders"),
+                Path(workdir) / "uploaders",
+            )
+        results["uploaders"] = upload_results["uploaders"]
+        results["subscribers"].update(upload_results["subscribers"])
+        results.update(
+            plan=plan_name,
+            created=now(),
+            speed=speed,
+            streams=[path.name for path in paths],
+        )
+        all_results[plan_name] = results
+
+        print(
+            f"{plan_name}: {results['documents']} documents in {results['elapsed']:.3f} s "
+            f"({results['documents_per_second']:.0f} documents/s), peak memory {results['peak_memory_mb']:.1f} MiB"
+        )
+        for label, per_doc in results["subscribers"].items():
+            total = sum(stats["calls"] * stats["p50"] for stats in per_doc.values())
+            worst = max(per_doc.items(), key=lambda item: item[1]["p99"])
+            print(
+                f"    {label:20} ~{total:.3f} s, worst p99 {1e3 * worst[1]['p99']:.3f} ms ({worst[0]})"
+            )
+        for label, stats in results["uploaders"].items():
+            print(
+                f"    {label:20} delivered the spool in {stats['elapsed']:.3f} s "
+                f"({stats['documents_per_second']:.0f} documents/s)"
+            )
+
+        (directory / "results").mkdir(parents=True, exist_ok=True)
+        with open(
+            directory / "results" / f"{plan_name}-{results['created']}.json", "w"
+        ) as f:
+            json.dump(results, f, indent=2)
+        baseline_path = directory / "baseline" / f"{plan_name}.json"
+        if update_baseline:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(baseline_path, "w") as f:
+                json.dump(results, f, indent=2)
+        elif baseline_path.exists():
+            compare_benchmark_to_baseline(results, baseline_path)
+    return all_results
+
+
+file_loading_timer.stop_timer(__file__)
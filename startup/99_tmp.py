@@ -4,7 +4,8 @@ import glob
 import os
 
 import numpy as np
-from PIL import Image
+
+Image = lazy_import("PIL.Image")
 
 
 def make_folder(file_path):
@@ -66,4 +67,8 @@ def save_image(file_path, mat, overwrite=True):
         raise ValueError("Couldn't write to file {}".format(file_path))
     return file_path
 
+
 file_loading_timer.stop_timer(__file__)
+
+# Write (and compare) the startup profile, see FileLoadingTimer.
+file_loading_timer.finish()